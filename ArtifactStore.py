@@ -0,0 +1,227 @@
+# ArtifactStore.py
+# This script implements a content-addressed store for pipeline stage outputs.
+# An artifact is keyed by the stage name, the hash of the stage's input files and the hash of
+# its configuration (relevant environment settings plus the stage script itself), so a stage whose
+# inputs have not changed can be served from the store instead of being run again.
+#
+# Layout under ARTIFACT_DIR:
+#   objects/<key[:2]>/<key>/<output files>   immutable once published
+#   index.sqlite                             metadata, references and last use times
+#
+# Artifacts are published atomically (written to a temporary directory, then renamed), jobs hold
+# references while they use an artifact, and collect() removes unreferenced artifacts that are
+# older than the retention period or that exceed the size budget, least recently used first.
+# A reference records the process holding it, so references left by a killed job are reclaimed
+# by the next collect() instead of pinning the artifact forever.
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ARTIFACT_DIR = os.getenv('ARTIFACT_DIR', 'artifacts')
+ARTIFACT_RETENTION_SECONDS = int(os.getenv('ARTIFACT_RETENTION_SECONDS', str(7 * 24 * 3600)))
+ARTIFACT_MAX_BYTES = int(os.getenv('ARTIFACT_MAX_BYTES', str(1024 ** 3)))
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def hash_files(paths):
+    """
+    Hash the contents of several files; missing files hash as absent so optional inputs are allowed.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.basename(path).encode('utf-8'))
+        digest.update(hash_file(path).encode('ascii') if os.path.exists(path) else b'-')
+    return digest.hexdigest()
+
+def hash_config(config):
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+
+def artifact_key(stage, input_hash, config_hash):
+    return hashlib.sha256(f"{stage}\0{input_hash}\0{config_hash}".encode('utf-8')).hexdigest()
+
+class ArtifactStore:
+    """
+    Content-addressed, reference-counted store of stage outputs.
+    """
+
+    def __init__(self, root=ARTIFACT_DIR):
+        self.root = os.path.abspath(root)
+        os.makedirs(os.path.join(self.root, 'objects'), exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(self.root, 'index.sqlite'), timeout=30, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS artifacts (
+                key TEXT PRIMARY KEY,
+                stage TEXT NOT NULL,
+                files TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS refs (key TEXT NOT NULL, pid INTEGER NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS refs_key ON refs (key)")
+
+    def close(self):
+        self.connection.close()
+
+    def _object_dir(self, key):
+        return os.path.join(self.root, 'objects', key[:2], key)
+
+    def get(self, key):
+        """
+        Look up an artifact and mark it as used.
+
+        Returns:
+        dict: {'path': directory, 'files': [names]}, or None if the artifact is not stored.
+        """
+        row = self.connection.execute("SELECT files FROM artifacts WHERE key = ?", (key,)).fetchone()
+        path = self._object_dir(key)
+        if row is None or not os.path.isdir(path):
+            return None
+        self.connection.execute("UPDATE artifacts SET last_used = ? WHERE key = ?", (time.time(), key))
+        return {'path': path, 'files': json.loads(row[0])}
+
+    def put(self, key, stage, paths):
+        """
+        Publish stage output files under key. Missing paths are skipped.
+
+        Args:
+        key (str): Artifact key from artifact_key().
+        stage (str): Stage name, kept for inspection and cleanup reports.
+        paths (list): Output files to store.
+
+        Returns:
+        dict: Same as get().
+        """
+        final_dir = self._object_dir(key)
+        os.makedirs(os.path.dirname(final_dir), exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=f".{key}.", dir=os.path.dirname(final_dir))
+        files = []
+        size = 0
+        try:
+            for path in paths:
+                if os.path.exists(path):
+                    name = os.path.basename(path)
+                    shutil.copyfile(path, os.path.join(tmp_dir, name))
+                    files.append(name)
+                    size += os.path.getsize(path)
+            try:
+                os.rename(tmp_dir, final_dir)
+            except OSError:
+                # Another job published the same artifact first; its copy is equivalent
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        now = time.time()
+        self.connection.execute("""
+            INSERT INTO artifacts (key, stage, files, size, created, last_used) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET last_used = excluded.last_used
+        """, (key, stage, json.dumps(files), size, now, now))
+        return self.get(key)
+
+    def materialize(self, artifact, dest_dir, expected_files=()):
+        """
+        Copy an artifact's files into a job directory.
+
+        Files the stage may produce but the artifact does not contain are removed from
+        dest_dir, so stale outputs from an earlier run are never picked up.
+
+        Args:
+        artifact (dict): Result of get() or put().
+        dest_dir (str): Job directory.
+        expected_files (iterable): Every output name the stage can produce.
+        """
+        for name in expected_files:
+            if name not in artifact['files'] and os.path.exists(os.path.join(dest_dir, name)):
+                os.remove(os.path.join(dest_dir, name))
+        for name in artifact['files']:
+            # Copy rather than link: jobs may modify their files, stored artifacts must stay immutable
+            tmp_path = os.path.join(dest_dir, f".{name}.tmp")
+            shutil.copyfile(os.path.join(artifact['path'], name), tmp_path)
+            os.replace(tmp_path, os.path.join(dest_dir, name))
+
+    def acquire(self, key):
+        """
+        Look up an artifact and take a reference on it in one transaction, so collect() cannot
+        remove it between the lookup and the reference. Pair with release().
+
+        Returns:
+        dict: Same as get(), or None if the artifact is not stored (no reference is taken).
+        """
+        path = self._object_dir(key)
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.connection.execute("SELECT files FROM artifacts WHERE key = ?", (key,)).fetchone()
+            if row is None or not os.path.isdir(path):
+                return None
+            self.connection.execute("INSERT INTO refs (key, pid) VALUES (?, ?)", (key, os.getpid()))
+            self.connection.execute("UPDATE artifacts SET last_used = ? WHERE key = ?", (time.time(), key))
+            return {'path': path, 'files': json.loads(row[0])}
+        finally:
+            self.connection.execute("COMMIT")
+
+    def release(self, key):
+        self.connection.execute(
+            "DELETE FROM refs WHERE rowid = (SELECT rowid FROM refs WHERE key = ? AND pid = ? LIMIT 1)",
+            (key, os.getpid()))
+
+    def _reclaim_dead_refs(self):
+        for (pid,) in self.connection.execute("SELECT DISTINCT pid FROM refs").fetchall():
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                self.connection.execute("DELETE FROM refs WHERE pid = ?", (pid,))
+            except PermissionError:
+                pass  # Alive, owned by another user
+
+    def collect(self, retention_seconds=ARTIFACT_RETENTION_SECONDS, max_bytes=ARTIFACT_MAX_BYTES):
+        """
+        Apply the retention policy to unreferenced artifacts.
+
+        Artifacts unused for longer than retention_seconds are removed, then the least
+        recently used ones until the store fits in max_bytes. Referenced artifacts are kept.
+
+        Returns:
+        int: Number of artifacts removed.
+        """
+        self._reclaim_dead_refs()
+        now = time.time()
+        total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+        removed = 0
+        unreferenced = "NOT EXISTS (SELECT 1 FROM refs WHERE refs.key = artifacts.key)"
+        rows = self.connection.execute(
+            f"SELECT key, size, last_used FROM artifacts WHERE {unreferenced} ORDER BY last_used"
+        ).fetchall()
+        for key, size, last_used in rows:
+            if now - last_used <= retention_seconds and total <= max_bytes:
+                break
+            # Delete the row first so no job is handed an artifact whose files are being removed
+            deleted = self.connection.execute(f"DELETE FROM artifacts WHERE key = ? AND {unreferenced}", (key,)).rowcount
+            if deleted:
+                shutil.rmtree(self._object_dir(key), ignore_errors=True)
+                total -= size
+                removed += 1
+        return removed
+
+if __name__ == "__main__":
+    store = ArtifactStore()
+    removed = store.collect()
+    count, size = store.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts").fetchone()
+    print(f"Removed {removed} artifacts; {count} artifacts ({size / 1024 / 1024:.1f} MB) remain in {store.root}")
@@ -0,0 +1,229 @@
+# ArxivIndex.py
+# This script builds an offline arXiv metadata index from a local metadata dump, such as the
+# Kaggle "arxiv-metadata-oai-snapshot.json" file (one JSON record per line, OAI-PMH fields).
+# ReferenceGenerator.py looks ids up here before touching the cache or the network.
+#
+# The index is a SQLite table keyed by the version-less arXiv id. Refreshing after the dump has
+# grown only reads the appended records; a replaced dump is rescanned and only records with a
+# newer update_date are rewritten.
+
+# Usage:
+# python ArxivIndex.py build <snapshot.json> [index path]
+# python ArxivIndex.py lookup <arxiv id> [index path]
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ARXIV_INDEX_PATH = os.getenv('ARXIV_INDEX_PATH', 'arxiv_index.sqlite')
+COMMIT_EVERY = 50000
+FINGERPRINT_BYTES = 4096
+
+# Strip the version suffix, e.g. 2408.12345v2 -> 2408.12345
+def base_arxiv_id(arxiv_id):
+    return re.sub(r'v\d+$', '', arxiv_id)
+
+def parse_record(line):
+    """
+    Convert one line of the metadata dump into an index row.
+
+    Args:
+    line (str): JSON record with id, title, authors_parsed/authors, versions and update_date.
+
+    Returns:
+    tuple: (id, authors json, year, title, update_date), or None if the line is not usable.
+    """
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    arxiv_id = record.get('id')
+    if not arxiv_id:
+        return None
+
+    if record.get('authors_parsed'):
+        # authors_parsed entries are [last name, first names, suffix]
+        authors = [" ".join(part for part in (first, last, suffix) if part)
+                   for last, first, suffix, *_ in (a + ['', ''] for a in record['authors_parsed'])]
+    else:
+        authors = [name.strip() for name in re.split(r',| and ', record.get('authors', '')) if name.strip()]
+
+    # arxiv.Result.published is the date of the first version; use the same year here
+    year = None
+    versions = record.get('versions') or []
+    if versions:
+        match = re.search(r'\b(\d{4})\b', versions[0].get('created', ''))
+        if match:
+            year = int(match.group(1))
+    if year is None and record.get('update_date'):
+        year = int(record['update_date'][:4])
+
+    title = " ".join(record.get('title', '').split())
+    return base_arxiv_id(arxiv_id), json.dumps(authors, ensure_ascii=False), year, title, record.get('update_date', '')
+
+class ArxivIndex:
+    """
+    Offline arXiv metadata lookup backed by a SQLite primary-key index.
+    """
+
+    def __init__(self, path=ARXIV_INDEX_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS papers (
+                id TEXT PRIMARY KEY,
+                authors TEXT NOT NULL,
+                year INTEGER,
+                title TEXT NOT NULL,
+                update_date TEXT NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get(self, arxiv_id):
+        """
+        Look up metadata for one arXiv id.
+
+        Args:
+        arxiv_id (str): arXiv id, with or without version suffix.
+
+        Returns:
+        dict: {'authors': [...], 'year': int, 'title': str}, or None if the id is not indexed.
+        """
+        row = self.connection.execute(
+            "SELECT authors, year, title FROM papers WHERE id = ?", (base_arxiv_id(arxiv_id),)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'authors': json.loads(row[0]), 'year': row[1], 'title': row[2]}
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    def _meta(self, key, default=None):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self.connection.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, str(value)),
+        )
+
+    def refresh(self, dump_path):
+        """
+        Bring the index up to date with a metadata dump.
+
+        If the dump is the same file as last time with records appended, only the new
+        tail is read. Otherwise the whole dump is scanned and rows are rewritten only
+        when the record's update_date is newer than the indexed one.
+
+        Args:
+        dump_path (str): Path to the JSON-lines metadata dump.
+
+        Returns:
+        int: Number of records read from the dump.
+        """
+        size = os.path.getsize(dump_path)
+        with open(dump_path, 'rb') as dump:
+            fingerprint = hashlib.sha256(dump.read(FINGERPRINT_BYTES)).hexdigest()
+
+        start = 0
+        if (self._meta('source_path') == os.path.abspath(dump_path)
+                and self._meta('source_fingerprint') == fingerprint
+                and int(self._meta('source_offset', 0)) <= size):
+            start = int(self._meta('source_offset', 0))
+
+        read = 0
+        batch = []
+        with open(dump_path, 'rb') as dump:
+            dump.seek(start)
+            offset = start
+            for line in dump:
+                if not line.endswith(b'\n'):
+                    break  # Partially written record; pick it up on the next refresh
+                offset += len(line)
+                row = parse_record(line)
+                read += 1
+                if row is not None:
+                    batch.append(row)
+                if len(batch) >= COMMIT_EVERY:
+                    self._upsert(batch)
+                    batch = []
+            self._upsert(batch)
+
+        self._set_meta('source_path', os.path.abspath(dump_path))
+        self._set_meta('source_fingerprint', fingerprint)
+        self._set_meta('source_offset', offset)
+        self.connection.commit()
+        return read
+
+    def _upsert(self, rows):
+        self.connection.executemany("""
+            INSERT INTO papers (id, authors, year, title, update_date) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                authors = excluded.authors,
+                year = excluded.year,
+                title = excluded.title,
+                update_date = excluded.update_date
+            WHERE excluded.update_date > papers.update_date
+        """, rows)
+
+def open_index(path=ARXIV_INDEX_PATH):
+    """
+    Open the offline index if it has been built.
+
+    Returns:
+    ArxivIndex: The index, or None if no index file exists at path.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    return ArxivIndex(path)
+
+def index_version(path=ARXIV_INDEX_PATH):
+    """
+    Identify the contents of the offline index by the dump it was last refreshed from.
+
+    Returns:
+    dict: source_path, source_fingerprint and source_offset, or None if no index exists at path.
+    """
+    index = open_index(path)
+    if index is None:
+        return None
+    with index:
+        return {key: index._meta(key) for key in ('source_path', 'source_fingerprint', 'source_offset')}
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ('build', 'lookup'):
+        print("Usage: python ArxivIndex.py build <snapshot.json> [index path]")
+        print("       python ArxivIndex.py lookup <arxiv id> [index path]")
+        sys.exit(1)
+
+    index_path = sys.argv[3] if len(sys.argv) > 3 else ARXIV_INDEX_PATH
+    with ArxivIndex(index_path) as index:
+        if sys.argv[1] == 'build':
+            read = index.refresh(sys.argv[2])
+            print(f"Read {read} records; {len(index)} papers are indexed in {index_path}")
+        else:
+            print(index.get(sys.argv[2]) or "Not found")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# Checkpoint.py
+# This script persists the completed sub-steps of a pipeline stage (parsed pages, chunk analyses,
+# the generated summary, ...) so a stage that is killed by its timeout and retried continues from
+# where it stopped instead of redoing finished work.
+#
+# Each stage has one append-only JSON Lines file in CHECKPOINT_DIR (relative to the job directory;
+# the Slack bot points it outside the job directory, which it deletes after every upload):
+#   {"fingerprint": "..."}              first line; hash of the stage's inputs and settings
+#   {"step": "page:3", "value": ...}    one line per completed sub-step
+# Appends survive the process being killed at any point; a torn last line is ignored. A checkpoint
+# whose fingerprint does not match the current inputs is discarded, and stages clear their
+# checkpoint once their outputs are written. Checkpoint directories kept outside job directories are
+# swept with remove_stale_checkpoints, since a paper that never completes would otherwise keep its own.
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHECKPOINT_DIR = os.getenv('CHECKPOINT_DIR', 'checkpoints')
+CHECKPOINT_RETENTION_SECONDS = int(os.getenv('CHECKPOINT_RETENTION_SECONDS', str(7 * 24 * 3600)))
+
+def fingerprint(*parts):
+    """
+    Hash strings, bytes or JSON-serialisable values into a checkpoint fingerprint.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        elif not isinstance(part, bytes):
+            part = json.dumps(part, sort_keys=True).encode('utf-8')
+        digest.update(hashlib.sha256(part).digest())
+    return digest.hexdigest()
+
+def file_fingerprint(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class Checkpoint:
+    """
+    Completed sub-steps of one stage.
+
+    Usage:
+    checkpoint = Checkpoint('GraphMaker2_png', fingerprint(content, settings))
+    if 'analysis' not in checkpoint:
+        checkpoint.put('analysis', analyze_paper(content))
+    analysis = checkpoint.get('analysis')
+    ...
+    checkpoint.clear()
+    """
+
+    def __init__(self, stage, fingerprint, directory=CHECKPOINT_DIR):
+        self.path = os.path.join(directory, f"{stage}.jsonl")
+        self.fingerprint = fingerprint
+        self.steps = {}
+        self._lock = threading.Lock()  # Chunked extraction records steps from several threads
+        if self._load():
+            if self.steps:
+                print(f"Resuming {stage} from checkpoint: {len(self.steps)} completed steps")
+        else:
+            os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'w', encoding='utf-8') as file:
+                file.write(json.dumps({'fingerprint': fingerprint}) + '\n')
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                lines = file.read().split('\n')
+        except FileNotFoundError:
+            return False
+        try:
+            if json.loads(lines[0]).get('fingerprint') != self.fingerprint:
+                return False  # Inputs or settings changed since the checkpoint was written
+        except ValueError:
+            return False
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Torn write from a killed process
+            self.steps[record['step']] = record['value']
+        if lines[-1]:
+            # Terminate a torn last line so the next record starts on a line of its own
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.write('\n')
+        return True
+
+    def __contains__(self, step):
+        return step in self.steps
+
+    def get(self, step, default=None):
+        return self.steps.get(step, default)
+
+    def put(self, step, value):
+        """
+        Record a completed step and hand it to the operating system before returning.
+        """
+        # A timeout kills the stage's process, not the machine, so a written line is safe without an fsync
+        line = json.dumps({'step': step, 'value': value}, ensure_ascii=False) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.write(line)
+            self.steps[step] = value
+        return value
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+def remove_stale_checkpoints(root, retention_seconds=CHECKPOINT_RETENTION_SECONDS, keep=()):
+    """
+    Delete the checkpoint directories under root that no stage has written to for retention_seconds.
+
+    Args:
+    root (str): Directory holding one checkpoint directory per job, e.g. the Slack bot's SLACK_CHECKPOINT_DIR.
+    retention_seconds (float): Age of the most recent write after which a directory is removed.
+    keep (iterable): Names of directories in use by running jobs; never removed.
+
+    Returns:
+    int: Number of directories removed.
+    """
+    if not os.path.isdir(root):
+        return 0
+    cutoff = time.time() - retention_seconds
+    keep = set(keep)
+    removed = 0
+    for entry in os.scandir(root):
+        if not entry.is_dir() or entry.name in keep:
+            continue
+        try:
+            # Appending a step updates the file, not the directory
+            last_write = max([entry.stat().st_mtime] + [file.stat().st_mtime for file in os.scandir(entry.path)])
+        except OSError:
+            continue  # Removed concurrently
+        if last_write < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
@@ -0,0 +1,177 @@
+# Compressor.py
+# This script shrinks paper text before it is sent to the LLM by keeping only the most central sentences.
+# Sentences are ranked with TextRank over TF-IDF cosine similarity, computed with NumPy on the CPU,
+# and the top sentences are kept up to a target share of the input tokens, in their original order.
+# The TF-IDF matrix is kept sparse and the similarity graph is applied without being built, so memory
+# grows with the length of the paper rather than with the square of its sentence count.
+
+# Required packages:
+# pip install numpy python-dotenv
+# numpy is imported on first use, so stages that leave compression disabled never load it.
+
+# Usage:
+# python Compressor.py [ratio]   compresses pdf_to_text_temp.txt and prints the result
+
+import os
+import re
+import sys
+from collections import Counter
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Share of input tokens to keep (0-1); 1 or more disables compression
+PRECOMPRESS_RATIO = float(os.getenv('PRECOMPRESS_RATIO', '1.0'))
+MAX_FEATURES = int(os.getenv('PRECOMPRESS_MAX_FEATURES', '4096'))
+DAMPING = 0.85
+MAX_ITERATIONS = 100
+TOLERANCE = 1e-6
+CHARS_PER_TOKEN = 4  # Rough token estimate for English text
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"(\[])')
+WORD = re.compile(r'[a-z][a-z0-9\-]+')
+STOPWORDS = frozenset("""
+a an and are as at be been being but by can could did do does for from had has have how however if in into is it
+its may more most much not of on or our such than that the their them then there these they this those through to
+under using via was we were what when where which while who will with within would also both each other only over
+""".split())
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+def split_sentences(text):
+    """
+    Split extracted paper text into sentences.
+
+    PDFParser writes one text block per line, so line breaks inside a paragraph
+    are joined first and hyphenated line ends are repaired.
+    """
+    text = re.sub(r'-\n(?=[a-z])', '', text)
+    text = re.sub(r'\s*\n\s*', ' ', text)
+    return [sentence.strip() for sentence in SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+
+def tfidf_matrix(sentences, max_features=MAX_FEATURES):
+    """
+    Build an L2-normalised TF-IDF matrix with one row per sentence, in sparse coordinate form.
+
+    Only the non-zero entries are stored, so memory grows with the number of words rather than
+    with sentences times vocabulary.
+
+    Args:
+    sentences (list): Sentences to vectorise.
+    max_features (int): Vocabulary size cap; the most widespread terms are kept.
+
+    Returns:
+    tuple: (rows, cols, values, shape); entry k of the matrix is values[k] at (rows[k], cols[k]).
+    """
+    import numpy as np
+
+    tokenized = [[word for word in WORD.findall(sentence.lower()) if word not in STOPWORDS] for sentence in sentences]
+    document_frequency = Counter(word for words in tokenized for word in set(words))
+    vocabulary = {word: i for i, (word, _) in enumerate(document_frequency.most_common(max_features))}
+
+    rows, cols, counts = [], [], []
+    for row, words in enumerate(tokenized):
+        for word, count in Counter(words).items():
+            col = vocabulary.get(word)
+            if col is not None:
+                rows.append(row)
+                cols.append(col)
+                counts.append(count)
+
+    rows = np.asarray(rows, dtype=np.intp)
+    cols = np.asarray(cols, dtype=np.intp)
+    df = np.asarray([document_frequency[word] for word in vocabulary], dtype=np.float64)
+    values = np.asarray(counts, dtype=np.float64) * (np.log((1 + len(sentences)) / (1 + df)) + 1)[cols]
+    norms = np.sqrt(np.bincount(rows, weights=values ** 2, minlength=len(sentences)))
+    values /= norms[rows]  # Every stored entry belongs to a row with a non-zero norm
+    return rows, cols, values, (len(sentences), len(vocabulary))
+
+def textrank_scores(matrix):
+    """
+    Rank sentences with PageRank over their cosine-similarity graph.
+
+    The n x n similarity matrix is never built: each iteration multiplies by it as
+    X (X^T v) minus its diagonal, using two passes over the sparse TF-IDF entries.
+
+    Args:
+    matrix (tuple): Row-normalised TF-IDF matrix from tfidf_matrix.
+
+    Returns:
+    numpy.ndarray: One score per sentence.
+    """
+    import numpy as np
+
+    rows, cols, values, (n, vocabulary_size) = matrix
+
+    def similarity_times(vector):
+        # (X X^T - diag(X X^T)) @ vector: similarity to every other sentence, excluding the sentence itself
+        term_weights = np.bincount(cols, weights=values * vector[rows], minlength=vocabulary_size)
+        product = np.bincount(rows, weights=values * term_weights[cols], minlength=n)
+        return product - self_similarity * vector
+
+    self_similarity = np.bincount(rows, weights=values ** 2, minlength=n)
+    out_weight = similarity_times(np.ones(n))
+    # Sentences sharing no terms with any other sentence link uniformly to all of them. Decided from the
+    # term counts rather than out_weight, which is only zero up to rounding
+    shared_terms = np.bincount(cols, minlength=vocabulary_size) >= 2
+    linked = np.bincount(rows, weights=shared_terms[cols], minlength=n) > 0
+
+    scores = np.full(n, 1.0 / n)
+    for _ in range(MAX_ITERATIONS):
+        outgoing = np.divide(scores, out_weight, out=np.zeros(n), where=linked)
+        incoming = similarity_times(outgoing) + scores[~linked].sum() / n
+        updated = (1 - DAMPING) / n + DAMPING * incoming
+        if np.abs(updated - scores).sum() < TOLERANCE:
+            return updated
+        scores = updated
+    return scores
+
+def compress_text(text, ratio=PRECOMPRESS_RATIO):
+    """
+    Keep the highest-ranked sentences up to ratio * input tokens, preserving order.
+
+    Args:
+    text (str): Paper text.
+    ratio (float): Share of tokens to keep; values >= 1 return the text unchanged.
+
+    Returns:
+    str: Compressed text.
+    """
+    if ratio >= 1:
+        return text
+    import numpy as np
+
+    sentences = split_sentences(text)
+    if len(sentences) < 2:
+        return text
+
+    scores = textrank_scores(tfidf_matrix(sentences))
+    budget = ratio * estimate_tokens(text)
+    kept = []
+    used = 0
+    for index in np.argsort(-scores, kind='stable'):
+        tokens = estimate_tokens(sentences[index])
+        if used + tokens > budget and kept:
+            continue  # Try shorter sentences that still fit
+        kept.append(index)
+        used += tokens
+        if used >= budget:
+            break
+    return ' '.join(sentences[index] for index in sorted(kept))
+
+def compress_for_llm(text, ratio=PRECOMPRESS_RATIO):
+    """
+    Compress text if pre-compression is enabled and report the saving.
+    """
+    if ratio >= 1:
+        return text
+    compressed = compress_text(text, ratio)
+    print(f"Pre-compressed paper text from ~{estimate_tokens(text)} to ~{estimate_tokens(compressed)} tokens")
+    return compressed
+
+if __name__ == "__main__":
+    ratio = float(sys.argv[1]) if len(sys.argv) > 1 else PRECOMPRESS_RATIO
+    with open('pdf_to_text_temp.txt', 'r', encoding='utf-8') as file:
+        print(compress_text(file.read(), ratio))
@@ -0,0 +1,96 @@
+# DocumentModel.py
+# This script defines the compact section model written by PDFParser.py in structured mode,
+# and lets the summary and graph stages read only the sections their prompts need.
+#
+# Section model (pdf_to_sections_temp.json):
+# {
+#   "title": str,
+#   "front_matter": str,            text before the first heading (authors, affiliations, arXiv stamp)
+#   "abstract": str,
+#   "sections": [{"heading": str, "kind": "body" | "appendix", "text": str}, ...],
+#   "captions": [str, ...],          figure and table captions
+#   "references": [str, ...]         bibliography entries (never sent to the LLM)
+# }
+#
+# Section names accepted by select_text: title, front_matter, abstract, body, appendix, captions,
+# references, or any other word, which matches section headings case-insensitively
+# (e.g. "introduction", "method", "conclusion").
+
+import json
+import os
+
+SECTIONS_PATH = 'pdf_to_sections_temp.json'
+
+def new_document():
+    return {'title': '', 'front_matter': '', 'abstract': '', 'sections': [], 'captions': [], 'references': []}
+
+def save_sections(document, path=SECTIONS_PATH):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(document, file, ensure_ascii=False, indent=2)
+
+def load_sections(path=SECTIONS_PATH):
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def parse_section_names(value):
+    """
+    Parse a comma-separated section list such as "title,abstract,introduction,conclusion".
+
+    Returns:
+    list: Lower-cased section names; empty if value is empty or None.
+    """
+    return [name.strip().lower() for name in (value or '').split(',') if name.strip()]
+
+def select_text(document, names):
+    """
+    Join the requested parts of a section model into prompt text, in document order.
+
+    Args:
+    document (dict): Section model produced by PDFParser.pdf2sections.
+    names (list): Section names, see the module header.
+
+    Returns:
+    str: Selected text.
+    """
+    names = set(names)
+    parts = []
+    if 'title' in names and document['title']:
+        parts.append(document['title'])
+    if 'front_matter' in names and document['front_matter']:
+        parts.append(document['front_matter'])
+    if 'abstract' in names and document['abstract']:
+        parts.append(f"Abstract\n{document['abstract']}")
+
+    heading_names = names - {'title', 'front_matter', 'abstract', 'body', 'appendix', 'captions', 'references'}
+    for section in document['sections']:
+        heading = section['heading'].lower()
+        if (section['kind'] in names) or any(name in heading for name in heading_names):
+            parts.append(f"{section['heading']}\n{section['text']}")
+
+    if 'captions' in names and document['captions']:
+        parts.append("\n".join(document['captions']))
+    if 'references' in names and document['references']:
+        parts.append("\n".join(document['references']))
+    return "\n\n".join(parts)
+
+def read_paper_text(text_path, section_names=None, sections_path=SECTIONS_PATH):
+    """
+    Read the paper text for an LLM stage.
+
+    If section names are given and PDFParser wrote a section model, only those
+    sections are returned; otherwise the full extracted text file is used.
+
+    Args:
+    text_path (str): Path to the flat text written by PDFParser.py.
+    section_names (list, optional): Sections to keep.
+    sections_path (str): Path to the section model.
+
+    Returns:
+    str: Paper text.
+    """
+    if section_names and os.path.exists(sections_path):
+        text = select_text(load_sections(sections_path), section_names)
+        if text.strip():
+            return text
+    with open(text_path, 'r', encoding='utf-8') as file:
+        return file.read()
@@ -2,23 +2,33 @@
 import os
 import re
 from dotenv import load_dotenv
-from groq import Groq
-import networkx as nx
-from pyvis.network import Network
 import json
 import time
-import matplotlib
-matplotlib.use('Agg')  # 使用非交互式后端
-import matplotlib.pyplot as plt
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from LLMClient import get_groq_client
+from DocumentModel import parse_section_names, read_paper_text
+from Compressor import compress_for_llm
+from Checkpoint import Checkpoint, fingerprint
+from Profiler import profile_stage, profiled_worker
 
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_MODEL = os.getenv("GROQ_MODEL")
+GRAPH_STORE_PATH = os.getenv("GRAPH_STORE_PATH", "knowledge_graph.kgb")
+GRAPH_IMAGE_PATH = os.getenv("GRAPH_IMAGE_PATH", "knowledge_graph.png")
+# Sections sent to the LLM when PDFParser ran in structured mode, e.g. "abstract,method,results,conclusion"
+GRAPH_SECTIONS = parse_section_names(os.getenv("GRAPH_SECTIONS"))
+# single: one request for the whole paper; chunked: concurrent per-chunk extraction, merged and pruned
+GRAPH_EXTRACTION_MODE = os.getenv("GRAPH_EXTRACTION_MODE", "single").lower()
+GRAPH_CHUNK_SIZE = int(os.getenv("GRAPH_CHUNK_SIZE", "6000"))  # Characters
+GRAPH_CHUNK_OVERLAP = int(os.getenv("GRAPH_CHUNK_OVERLAP", "300"))
+GRAPH_MAX_WORKERS = int(os.getenv("GRAPH_MAX_WORKERS", "4"))
+GRAPH_TOP_K = int(os.getenv("GRAPH_TOP_K", "15"))
 
 def read_paper_content(file_path='pdf_to_text_temp.txt'):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return file.read()
+    return read_paper_text(file_path, GRAPH_SECTIONS)
 
 def extract_json_from_text(text):
     # Remove possible Markdown code block markers
@@ -40,14 +50,14 @@ def extract_json_from_text(text):
     
     return None
 
-def analyze_paper(content):
-    client = Groq(api_key=GROQ_API_KEY)
+def analyze_paper(content, client=None, entity_limit="7-10"):
+    client = client if client is not None else get_groq_client(GROQ_API_KEY)
     
     prompt = """
     As a professional academic paper analysis expert, please carefully analyze the following paper content and extract key concepts, methods, results, and conclusions.
 
     Please follow these guidelines:
-    1. Identify the main research topics and key concepts (no more than 7-10 main entities)
+    1. Identify the main research topics and key concepts (no more than {entity_limit} main entities)
     2. Extract important methods or techniques used
     3. Summarize the main research findings and results
     4. Identify the paper's main conclusions and contributions
@@ -72,7 +82,7 @@ def analyze_paper(content):
                 model=GROQ_MODEL,
                 messages=[
                     {"role": "system", "content": "You are an expert in analyzing academic papers and extracting key information."},
-                    {"role": "user", "content": prompt.format(content=content)}
+                    {"role": "user", "content": prompt.format(content=content, entity_limit=entity_limit)}
                 ]
             )
             
@@ -81,7 +91,8 @@ def analyze_paper(content):
             print(result)  # Print raw response
             
             # Extract and parse JSON from the response
-            parsed_result = extract_json_from_text(result)
+            with profile_stage('GraphMaker2_png.extract_json'):
+                parsed_result = extract_json_from_text(result)
             if parsed_result and 'entities' in parsed_result and 'relations' in parsed_result:
                 return parsed_result
             
@@ -97,7 +108,92 @@ def analyze_paper(content):
     print("Maximum retry attempts reached. Returning empty result.")
     return {"entities": [], "relations": []}
 
+def split_into_chunks(content, chunk_size=GRAPH_CHUNK_SIZE, chunk_overlap=GRAPH_CHUNK_OVERLAP):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+    )
+    return text_splitter.split_text(content)
+
+def merge_analyses(analyses, top_k=GRAPH_TOP_K):
+    """
+    Merge per-chunk extraction results into one graph.
+
+    Entities are merged by canonical label. Each entity is ranked by the sum of its
+    importance over all chunks it appears in, keeps its highest single importance,
+    and only the top_k entities and the relations between them are returned.
+    """
+    from GraphStore import canonical_label
+
+    labels = {}
+    scores = Counter()
+    importance = {}
+    relation_labels = {}
+    relation_direction = {}
+
+    for analysis in analyses:
+        local_keys = {}
+        for entity in analysis.get('entities', []):
+            key = canonical_label(entity.get('label', ''))
+            if not key:
+                continue
+            try:
+                value = float(entity.get('importance', 1))
+            except (TypeError, ValueError):
+                value = 1.0
+            local_keys[str(entity.get('id'))] = key
+            labels.setdefault(key, Counter())[entity['label']] += 1
+            scores[key] += value
+            importance[key] = max(importance.get(key, 0), value)
+
+        for relation in analysis.get('relations', []):
+            source = local_keys.get(str(relation.get('source')))
+            target = local_keys.get(str(relation.get('target')))
+            if source is None or target is None or source == target:
+                continue
+            # The graph is undirected, so A->B and B->A are the same edge; keep the first direction seen
+            pair = tuple(sorted((source, target)))
+            relation_direction.setdefault(pair, (source, target))
+            relation_labels.setdefault(pair, Counter())[relation.get('label', '')] += 1
+
+    ranked = sorted(scores, key=lambda key: (-scores[key], -importance[key], key))[:top_k]
+    ids = {key: i + 1 for i, key in enumerate(ranked)}
+    entities = [
+        {'id': ids[key], 'label': labels[key].most_common(1)[0][0], 'importance': int(round(importance[key]))}
+        for key in ranked
+    ]
+    relations = [
+        {'source': ids[source], 'target': ids[target], 'label': relation_labels[pair].most_common(1)[0][0]}
+        for pair, (source, target) in relation_direction.items()
+        if source in ids and target in ids
+    ]
+    return {"entities": entities, "relations": relations}
+
+def analyze_paper_chunked(content, client=None, max_workers=GRAPH_MAX_WORKERS, top_k=GRAPH_TOP_K, checkpoint=None):
+    client = client if client is not None else get_groq_client(GROQ_API_KEY)
+    chunks = split_into_chunks(content)
+    print(f"Extracting entities from {len(chunks)} chunks with {max_workers} workers")
+
+    def analyze_chunk(index):
+        # Chunks finished by an interrupted attempt are not sent again
+        step = f"chunk:{index}"
+        if checkpoint is not None and step in checkpoint:
+            return checkpoint.get(step)
+        analysis = analyze_paper(chunks[index], client=client, entity_limit="5-8")
+        if checkpoint is not None and analysis['entities']:
+            checkpoint.put(step, analysis)  # Failed chunks are retried rather than replayed
+        return analysis
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        analyses = list(executor.map(profiled_worker(analyze_chunk), range(len(chunks))))
+    return merge_analyses(analyses, top_k)
+
 def create_knowledge_graph(entities, relations):
+    import networkx as nx
+
     G = nx.Graph()
     
     for entity in entities:
@@ -109,6 +205,11 @@ def create_knowledge_graph(entities, relations):
     return G
 
 def visualize_graph(G):
+    import networkx as nx
+    import matplotlib
+    matplotlib.use('Agg')  # 使用非交互式后端
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(12, 8))
     
     pos = nx.spring_layout(G)
@@ -124,13 +225,25 @@ def visualize_graph(G):
     
     plt.title("Knowledge Graph")
     plt.axis('off')
-    plt.savefig("knowledge_graph.png")
+    plt.savefig(GRAPH_IMAGE_PATH)
+    plt.close()  # Long-lived workers render many graphs; do not keep old figures alive
     # plt.show()  # 移除这行以避免弹出窗口显示图片
-    print("Knowledge graph has been generated and saved as 'knowledge_graph.png'.")
+    print(f"Knowledge graph has been generated and saved as '{GRAPH_IMAGE_PATH}'.")
 
 def main():
-    content = read_paper_content()
-    analysis_result = analyze_paper(content)
+    with profile_stage('GraphMaker2_png.compress'):
+        content = compress_for_llm(read_paper_content())
+    settings = [GROQ_MODEL, GRAPH_EXTRACTION_MODE, GRAPH_CHUNK_SIZE, GRAPH_CHUNK_OVERLAP, GRAPH_TOP_K]
+    checkpoint = Checkpoint('GraphMaker2_png', fingerprint(content, settings))
+    analysis_result = checkpoint.get('analysis')
+    if analysis_result is None:
+        with profile_stage('GraphMaker2_png.analyze_paper'):
+            if GRAPH_EXTRACTION_MODE == 'chunked':
+                analysis_result = analyze_paper_chunked(content, checkpoint=checkpoint)
+            else:
+                analysis_result = analyze_paper(content)
+        if analysis_result['entities'] and analysis_result['relations']:
+            checkpoint.put('analysis', analysis_result)
     
     if not analysis_result['entities'] or not analysis_result['relations']:
         print("Warning: Entity or relation list is empty.")
@@ -138,13 +251,21 @@ def main():
         print("Relations:", analysis_result['relations'])
         return
     
-    G = create_knowledge_graph(analysis_result['entities'], analysis_result['relations'])
+    with profile_stage('GraphMaker2_png.create_knowledge_graph'):
+        G = create_knowledge_graph(analysis_result['entities'], analysis_result['relations'])
     
     if G.number_of_nodes() == 0:
         print("Error: Generated graph has no nodes.")
         return
     
-    visualize_graph(G)
+    # Keep the extracted graph so it can be analysed or re-rendered without another API call
+    from GraphStore import save_graph
+    save_graph(G, GRAPH_STORE_PATH)
+    print(f"Knowledge graph data has been saved to {GRAPH_STORE_PATH}")
+    
+    with profile_stage('GraphMaker2_png.visualize_graph'):
+        visualize_graph(G)
+    checkpoint.clear()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,575 @@
+# GraphQuery.py
+# This script serves stored knowledge graphs (.kgb files, see GraphStore.py) through a small local
+# HTTP/JSON API, so questions such as "which papers connect method X to result Y" can be answered
+# without running the extraction again.
+#
+# Each graph is memory-mapped and indexed in memory: CSR adjacency arrays in both edge directions
+# (built when the graph is loaded) and, on first use, a label dictionary with a sorted key list for
+# prefix search, a trigram index for fuzzy search and an importance ranking. Query results are kept
+# in an LRU cache.
+#
+# Endpoints (GET, JSON; `graph` selects one graph, otherwise every loaded graph is queried):
+#   /graphs                                            loaded graphs with node and edge counts
+#   /neighbors?node=X&hops=1&direction=both            entities within `hops` edges of X
+#   /paths?source=X&target=Y&k=3&direction=both        paths of at most k edges, shortest first
+#   /search?q=trans&mode=prefix                        label search; mode is prefix or fuzzy
+#   /top                                               entities with the highest importance
+#   /stats                                             cache statistics
+# POST /reload rescans the graph paths and clears the cache.
+# Nodes are referred to by label (case- and punctuation-insensitive) or by id; direction is out, in
+# or both, and only matters for directed graphs. Every list endpoint takes limit (default 20).
+
+# Required packages:
+# pip install numpy python-dotenv
+
+# Usage:
+# python GraphQuery.py [path ...]   .kgb files or directories searched for them (default GRAPH_QUERY_PATHS)
+
+import bisect
+import difflib
+import json
+import os
+import sys
+import threading
+import traceback
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from dotenv import load_dotenv
+from GraphStore import _restore_number, canonical_label, load_graph
+
+load_dotenv()
+
+GRAPH_QUERY_HOST = os.getenv('GRAPH_QUERY_HOST', '127.0.0.1')
+GRAPH_QUERY_PORT = int(os.getenv('GRAPH_QUERY_PORT', '8765'))
+# Comma-separated .kgb files or directories; the artifact store holds every graph the pipeline produced
+GRAPH_QUERY_PATHS = os.getenv('GRAPH_QUERY_PATHS', 'knowledge_graph.kgb,artifacts')
+GRAPH_QUERY_CACHE_SIZE = int(os.getenv('GRAPH_QUERY_CACHE_SIZE', '1024'))
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 1000
+MAX_HOPS = 4
+FUZZY_CANDIDATES = 200  # Labels sharing the most trigrams with the query that are scored exactly
+FUZZY_CUTOFF = 0.6
+DIRECTIONS = ('out', 'in', 'both')
+REVERSE_DIRECTION = {'out': 'in', 'in': 'out', 'both': 'both'}
+
+def _csr(keys, values, number_of_nodes):
+    # Group edges by one endpoint: offsets[i]:offsets[i + 1] indexes the edges of node i
+    order = np.argsort(keys, kind='stable')
+    offsets = np.zeros(number_of_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=number_of_nodes), out=offsets[1:])
+    return offsets, np.asarray(values[order], dtype=np.int64), order.astype(np.int64)
+
+def _gather(adjacency, nodes):
+    """
+    Expand many nodes at once.
+
+    Returns:
+    tuple: (source nodes, neighbour nodes, edge indices), one entry per adjacent edge.
+    """
+    offsets, neighbours, edges = adjacency
+    starts = offsets[nodes]
+    counts = offsets[nodes + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    # Position of every adjacent edge: its node's start plus its rank within that node
+    positions = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(total)
+    return np.repeat(nodes, counts), neighbours[positions], edges[positions]
+
+class GraphIndex:
+    """
+    In-memory query indexes over one stored graph.
+    """
+
+    def __init__(self, graph, name):
+        self.graph = graph
+        self.name = name
+        self.directed = graph.directed
+        self.number_of_nodes = graph.number_of_nodes
+        sources = np.asarray(graph.edge_source, dtype=np.int64)
+        targets = np.asarray(graph.edge_target, dtype=np.int64)
+        self._adjacency = {
+            'out': _csr(sources, targets, self.number_of_nodes),
+            'in': _csr(targets, sources, self.number_of_nodes),
+        }
+        self._lock = threading.Lock()
+        self._labels = None
+        self._ids = None
+        self._trigrams = None
+        self._ranking = None
+
+    # Node and edge descriptions
+
+    def node(self, index):
+        graph = self.graph
+        node_id = graph.string(graph.node_id[index])
+        if graph.header.get('node_id_type') == 'int':
+            node_id = int(node_id)
+        return {
+            'id': node_id,
+            'label': graph.string(graph.node_label[index]),
+            'importance': _restore_number(graph.node_importance[index]),
+        }
+
+    def edge(self, index):
+        graph = self.graph
+        return {
+            'source': self.node(int(graph.edge_source[index]))['id'],
+            'target': self.node(int(graph.edge_target[index]))['id'],
+            'label': graph.string(graph.edge_label[index]),
+        }
+
+    def _expand(self, nodes, direction):
+        if not self.directed or direction == 'both':
+            parts = [_gather(self._adjacency['out'], nodes), _gather(self._adjacency['in'], nodes)]
+            return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+        return _gather(self._adjacency[direction], nodes)
+
+    # Lazily built indexes
+
+    def _label_index(self):
+        with self._lock:
+            if self._labels is None:
+                # Group nodes by label string, then group label strings by canonical key
+                unique_labels, inverse = np.unique(np.asarray(self.graph.node_label), return_inverse=True)
+                order = np.argsort(inverse, kind='stable')
+                offsets = np.zeros(len(unique_labels) + 1, dtype=np.int64)
+                np.cumsum(np.bincount(inverse, minlength=len(unique_labels)), out=offsets[1:])
+                strings = self.graph.strings()
+                by_key = {}
+                for position, label in enumerate(unique_labels.tolist()):
+                    by_key.setdefault(canonical_label(strings[label]), []).append(position)
+                self._labels = (by_key, sorted(by_key), order, offsets)
+            return self._labels
+
+    def _nodes_for_key(self, key):
+        by_key, _, order, offsets = self._label_index()
+        positions = by_key.get(key, [])
+        return [int(node) for position in positions for node in order[offsets[position]:offsets[position + 1]]]
+
+    def _id_index(self):
+        with self._lock:
+            if self._ids is None:
+                strings = self.graph.strings()
+                self._ids = {strings[node_id]: index for index, node_id in enumerate(self.graph.node_id.tolist())}
+            return self._ids
+
+    def _trigram_index(self):
+        keys = self._label_index()[1]
+        with self._lock:
+            if self._trigrams is None:
+                # All keys in one byte buffer separated by NUL, so trigrams are computed with array operations
+                encoded = [key.encode('utf-8') for key in keys]
+                data = np.frombuffer(b'\0'.join(encoded), dtype=np.uint8).astype(np.uint32)
+                key_of_byte = np.repeat(np.arange(len(encoded), dtype=np.uint64), [len(key) + 1 for key in encoded])[:len(data)]
+                codes = data[:-2] << 16 | data[1:-1] << 8 | data[2:]
+                valid = (data[:-2] != 0) & (data[1:-1] != 0) & (data[2:] != 0)
+                pairs = np.sort(codes[valid].astype(np.uint64) << 32 | key_of_byte[:-2][valid])
+                if pairs.size == 0:
+                    # No key is three bytes long (e.g. only "AI" and "ML"), so there is nothing to index
+                    self._trigrams = (np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int64))
+                    return self._trigrams
+                pairs = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))]  # A key repeating a trigram is listed once
+                self._trigrams = ((pairs >> 32).astype(np.uint32), (pairs & 0xFFFFFFFF).astype(np.int64))
+            return self._trigrams
+
+    def _importance_ranking(self):
+        with self._lock:
+            if self._ranking is None:
+                self._ranking = np.argsort(-np.asarray(self.graph.node_importance), kind='stable')
+            return self._ranking
+
+    def warm(self):
+        """
+        Build every lazy index now, so the first queries are as fast as later ones.
+        """
+        self._label_index()
+        self._id_index()
+        self._trigram_index()
+        self._importance_ranking()
+
+    # Queries
+
+    def resolve(self, reference):
+        """
+        Node indices matching a label (canonical comparison) or, failing that, a node id.
+        """
+        nodes = self._nodes_for_key(canonical_label(reference))
+        if not nodes and reference in self._id_index():
+            nodes = [self._id_index()[reference]]
+        return nodes
+
+    def neighbors(self, reference, hops=1, direction='both', limit=DEFAULT_LIMIT):
+        """
+        Entities within `hops` edges, nearest first and by importance within a hop.
+        """
+        start = np.asarray(self.resolve(reference), dtype=np.int64)
+        if start.size == 0:
+            return None
+        visited = np.zeros(self.number_of_nodes, dtype=bool)
+        visited[start] = True
+        frontier = start
+        results = []
+        for hop in range(1, hops + 1):
+            sources, neighbours, edges = self._expand(frontier, direction)
+            fresh = ~visited[neighbours]
+            neighbours, first = np.unique(neighbours[fresh], return_index=True)
+            if neighbours.size == 0:
+                break
+            sources, edges = sources[fresh][first], edges[fresh][first]
+            visited[neighbours] = True
+            ranking = np.argsort(-np.asarray(self.graph.node_importance)[neighbours], kind='stable')
+            for i in ranking[:limit - len(results)].tolist():
+                results.append({
+                    **self.node(int(neighbours[i])),
+                    'hops': hop,
+                    'via': {'from': self.node(int(sources[i]))['id'], 'label': self.graph.string(self.graph.edge_label[edges[i]])},
+                })
+            if len(results) >= limit:
+                break
+            frontier = neighbours
+        return {'nodes': [self.node(node) for node in start.tolist()], 'neighbors': results}
+
+    def paths(self, source, target, k=3, direction='both', limit=DEFAULT_LIMIT):
+        """
+        Simple paths of at most k edges from any node matching source to any node matching target.
+        """
+        sources = self.resolve(source)
+        targets = np.asarray(self.resolve(target), dtype=np.int64)
+        if not sources or targets.size == 0:
+            return []
+
+        # Distance to the nearest target, found by a backwards breadth-first search up to k edges
+        distance = np.full(self.number_of_nodes, -1, dtype=np.int16)
+        distance[targets] = 0
+        frontier = targets
+        for step in range(1, k + 1):
+            _, neighbours, _ = self._expand(frontier, REVERSE_DIRECTION[direction])
+            frontier = np.unique(neighbours[distance[neighbours] < 0])
+            if frontier.size == 0:
+                break
+            distance[frontier] = step
+
+        found = []
+
+        def extend(path, edges, length):
+            node = path[-1]
+            remaining = length - len(edges)
+            _, neighbours, via = self._expand(np.asarray([node], dtype=np.int64), direction)
+            reachable = distance[neighbours]
+            # Only step to nodes that can still reach a target within the remaining edges
+            keep = (reachable >= 0) & (reachable <= remaining - 1)
+            for neighbour, edge in zip(neighbours[keep].tolist(), via[keep].tolist()):
+                if len(found) >= limit:
+                    return
+                if neighbour in path:
+                    continue
+                if distance[neighbour] == 0:
+                    if remaining == 1:
+                        found.append((path + [neighbour], edges + [edge]))
+                    continue  # Paths end at the first target they reach
+                if remaining > 1:
+                    extend(path + [neighbour], edges + [edge], length)
+
+        # Iterative deepening yields the shortest paths first
+        shortest = min((int(distance[node]) for node in sources if distance[node] >= 0), default=-1)
+        if shortest < 0:
+            return []
+        for length in range(max(shortest, 1), k + 1):
+            for node in sources:
+                if 0 < distance[node] <= length and len(found) < limit:
+                    extend([node], [], length)
+        return [{'nodes': [self.node(node) for node in path], 'edges': [self.edge(edge) for edge in edges]}
+                for path, edges in found]
+
+    def search_prefix(self, query, limit=DEFAULT_LIMIT):
+        prefix = _search_key(query)
+        _, keys, _, _ = self._label_index()
+        results = []
+        position = bisect.bisect_left(keys, prefix)
+        while position < len(keys) and keys[position].startswith(prefix) and len(results) < limit:
+            results.extend(self.node(node) for node in self._nodes_for_key(keys[position]))
+            position += 1
+        return results[:limit]
+
+    def search_fuzzy(self, query, limit=DEFAULT_LIMIT):
+        key = _search_key(query)
+        data = np.frombuffer(key.encode('utf-8'), dtype=np.uint8).astype(np.uint32)
+        if data.size < 3:
+            return self.search_prefix(query, limit)
+        _, keys, _, _ = self._label_index()
+        codes, posting = self._trigram_index()
+        query_codes = np.unique(data[:-2] << 16 | data[1:-1] << 8 | data[2:])
+        starts = np.searchsorted(codes, query_codes, side='left')
+        ends = np.searchsorted(codes, query_codes, side='right')
+        if not (ends > starts).any():
+            return []
+        shared = np.bincount(np.concatenate([posting[s:e] for s, e in zip(starts, ends)]), minlength=len(keys))
+        candidates = np.flatnonzero(shared)
+        if candidates.size > FUZZY_CANDIDATES:
+            candidates = candidates[np.argpartition(-shared[candidates], FUZZY_CANDIDATES)[:FUZZY_CANDIDATES]]
+        matcher = difflib.SequenceMatcher(None, b=key)  # The query side is analysed once
+        scored = []
+        for candidate in candidates.tolist():
+            matcher.set_seq1(keys[candidate])
+            score = matcher.ratio()
+            if score >= FUZZY_CUTOFF:
+                scored.append((score, keys[candidate]))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        results = []
+        for score, match in scored:
+            results.extend({**self.node(node), 'score': round(score, 3)} for node in self._nodes_for_key(match))
+            if len(results) >= limit:
+                break
+        return results[:limit]
+
+    def top(self, limit=DEFAULT_LIMIT):
+        return [self.node(node) for node in self._importance_ranking()[:limit].tolist()]
+
+def _search_key(query):
+    # A query of punctuation only (e.g. "!!!") canonicalizes to '' and would match every label
+    key = canonical_label(query)
+    if not key:
+        raise ValueError("Search query has no letters or digits")
+    return key
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache of query results.
+    """
+
+    def __init__(self, maxsize=GRAPH_QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+def find_graph_files(paths):
+    """
+    Expand files and directories into the .kgb files they contain.
+    """
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, files in os.walk(path):
+                found.extend(os.path.join(directory, name) for name in sorted(files) if name.endswith('.kgb'))
+        elif os.path.isfile(path):
+            found.append(path)
+    return found
+
+def graph_name(path):
+    # Graphs in the artifact store live in objects/<xx>/<artifact key>/knowledge_graph.kgb
+    directory, file_name = os.path.split(os.path.abspath(path))
+    stem = os.path.splitext(file_name)[0]
+    parent = os.path.basename(directory)
+    return f"{stem}-{parent[:12]}" if len(parent) == 64 else stem
+
+class GraphService:
+    """
+    The loaded graphs, their indexes and the result cache, independent of HTTP.
+    """
+
+    def __init__(self, paths, cache_size=GRAPH_QUERY_CACHE_SIZE, warm=False):
+        self.paths = paths
+        self.warm = warm
+        self.cache = LRUCache(cache_size)
+        self.graphs = {}
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        graphs = {}
+        for path in find_graph_files(self.paths):
+            name = graph_name(path)
+            if name in graphs:
+                name = f"{name}-{len(graphs)}"
+            graphs[name] = GraphIndex(load_graph(path), name)
+            if self.warm:
+                graphs[name].warm()
+        with self._lock:
+            self.graphs = graphs
+            self.cache.clear()
+        return len(graphs)
+
+    def _selected(self, params):
+        name = params.get('graph')
+        if name is None:
+            return list(self.graphs.values())
+        if name not in self.graphs:
+            raise KeyError(f"Unknown graph: {name}")
+        return [self.graphs[name]]
+
+    def query(self, endpoint, params):
+        """
+        Answer a query, from the cache when possible.
+
+        Args:
+        endpoint (str): 'graphs', 'neighbors', 'paths', 'search', 'top' or 'stats'.
+        params (dict): Query parameters as strings.
+
+        Returns:
+        dict: JSON-serialisable result.
+
+        Raises:
+        ValueError: For missing or invalid parameters or an unknown endpoint.
+        KeyError: For an unknown graph.
+        """
+        if endpoint == 'stats':
+            return {'cache': self.cache.stats(), 'graphs': len(self.graphs)}
+        key = (endpoint, tuple(sorted(params.items())))
+        result = self.cache.get(key)
+        if result is None:
+            result = self._run(endpoint, params)
+            self.cache.put(key, result)
+        return result
+
+    def _run(self, endpoint, params):
+        limit = _int_param(params, 'limit', DEFAULT_LIMIT, 1, MAX_LIMIT)
+        direction = params.get('direction', 'both')
+        if direction not in DIRECTIONS:
+            raise ValueError(f"direction must be one of {', '.join(DIRECTIONS)}")
+
+        if endpoint == 'graphs':
+            return {'graphs': [{'graph': index.name, 'nodes': index.number_of_nodes,
+                                'edges': index.graph.number_of_edges, 'directed': index.directed}
+                               for index in self.graphs.values()]}
+
+        if endpoint == 'neighbors':
+            node = _required(params, 'node')
+            hops = _int_param(params, 'hops', 1, 1, MAX_HOPS)
+            results = []
+            for index in self._selected(params):
+                found = index.neighbors(node, hops, direction, limit)
+                if found:
+                    results.append({'graph': index.name, **found})
+            return {'results': results}
+
+        if endpoint == 'paths':
+            source, target = _required(params, 'source'), _required(params, 'target')
+            k = _int_param(params, 'k', 3, 1, MAX_HOPS)
+            results = []
+            for index in self._selected(params):
+                found = index.paths(source, target, k, direction, limit)
+                if found:
+                    results.append({'graph': index.name, 'paths': found})
+            return {'results': results}
+
+        if endpoint == 'search':
+            query = _required(params, 'q')
+            mode = params.get('mode', 'prefix')
+            if mode not in ('prefix', 'fuzzy'):
+                raise ValueError("mode must be prefix or fuzzy")
+            results = []
+            for index in self._selected(params):
+                search = index.search_fuzzy if mode == 'fuzzy' else index.search_prefix
+                results.extend({'graph': index.name, **node} for node in search(query, limit))
+            if mode == 'fuzzy':
+                results.sort(key=lambda node: -node['score'])
+            return {'results': results[:limit]}
+
+        if endpoint == 'top':
+            results = [{'graph': index.name, **node} for index in self._selected(params) for node in index.top(limit)]
+            results.sort(key=lambda node: -float(node['importance']))
+            return {'results': results[:limit]}
+
+        raise ValueError(f"Unknown endpoint: {endpoint}")
+
+def _required(params, name):
+    value = params.get(name, '').strip()
+    if not value:
+        raise ValueError(f"Missing parameter: {name}")
+    return value
+
+def _int_param(params, name, default, minimum, maximum):
+    try:
+        value = int(params.get(name, default))
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+    return max(minimum, min(value, maximum))
+
+def make_handler(service):
+    class QueryHandler(BaseHTTPRequestHandler):
+        def _respond(self, status, body):
+            payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            try:
+                self._respond(200, service.query(url.path.strip('/'), params))
+            except KeyError as e:
+                self._respond(404, {'error': e.args[0]})
+            except ValueError as e:
+                self._respond(400, {'error': str(e)})
+            except Exception as e:
+                self._internal_error(e)
+
+        def do_POST(self):
+            if urlparse(self.path).path.strip('/') != 'reload':
+                self._respond(404, {'error': f"Unknown endpoint: {self.path}"})
+                return
+            try:
+                self._respond(200, {'graphs': service.reload()})
+            except Exception as e:
+                self._internal_error(e)
+
+        def _internal_error(self, error):
+            # e.g. a corrupt .kgb file; answer instead of dropping the connection
+            print(f"Error handling {self.command} {self.path}:", file=sys.stderr)
+            traceback.print_exc()
+            self._respond(500, {'error': f"{type(error).__name__}: {error}"})
+
+        def log_message(self, format, *args):
+            pass  # Keep the console quiet under load
+
+    return QueryHandler
+
+def main():
+    paths = sys.argv[1:] or [path.strip() for path in GRAPH_QUERY_PATHS.split(',') if path.strip()]
+    service = GraphService(paths, warm=True)
+    print(f"Loaded {len(service.graphs)} graphs: {', '.join(service.graphs) or 'none'}")
+    server = ThreadingHTTPServer((GRAPH_QUERY_HOST, GRAPH_QUERY_PORT), make_handler(service))
+    print(f"Serving graph queries on http://{GRAPH_QUERY_HOST}:{GRAPH_QUERY_PORT}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
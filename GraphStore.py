@@ -0,0 +1,377 @@
+# GraphStore.py
+# This script stores knowledge graphs produced by create_knowledge_graph in a compact binary format.
+# Labels are interned into a single string table and edges are kept as integer node-index arrays,
+# so a stored graph can be memory-mapped and analysed or re-rendered without another LLM call.
+#
+# File layout (.kgb):
+#   magic (4 bytes) | header length (uint32 LE) | JSON header | padding | 8-byte aligned arrays
+# The JSON header records the dtype, byte offset and length of every array.
+#
+# Node ids are restored as ints when every id in the graph is an integer and as strings otherwise;
+# other ids (bool, float, a mix of int and str) are stored as their str() and read back as strings.
+
+# Required packages:
+# pip install numpy networkx
+
+import json
+import os
+import re
+import struct
+
+import numpy as np
+
+MAGIC = b'KGB1'
+ALIGNMENT = 8
+
+# Array name -> dtype, in the order they are written to disk
+ARRAY_DTYPES = {
+    'string_offsets': '<u4',
+    'string_data': 'u1',
+    'node_id': '<u4',
+    'node_label': '<u4',
+    'node_importance': '<f4',
+    'edge_source': '<u4',
+    'edge_target': '<u4',
+    'edge_label': '<u4',
+}
+
+
+class StringTable:
+    """
+    Intern strings so that every distinct label is stored exactly once.
+    """
+
+    def __init__(self):
+        self._index = {}
+        self._strings = []
+
+    def intern(self, value):
+        """
+        Return the integer id of a string, adding it to the table if needed.
+
+        Args:
+        value: The value to intern. Non-string values are converted with str().
+
+        Returns:
+        int: Index of the value in the table.
+        """
+        value = '' if value is None else str(value)
+        index = self._index.get(value)
+        if index is None:
+            index = len(self._strings)
+            self._index[value] = index
+            self._strings.append(value)
+        return index
+
+    def to_arrays(self):
+        """
+        Encode the table as an offsets array and a UTF-8 byte blob.
+
+        Returns:
+        tuple: (offsets, data) numpy arrays.
+        """
+        encoded = [s.encode('utf-8') for s in self._strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=ARRAY_DTYPES['string_offsets'])
+        if encoded:
+            offsets[1:] = np.cumsum([len(b) for b in encoded])
+        data = np.frombuffer(b''.join(encoded), dtype=ARRAY_DTYPES['string_data'])
+        return offsets, data
+
+
+class CompactGraph:
+    """
+    Read-only view over a stored knowledge graph.
+
+    Arrays are slices of a single buffer (usually a memory map), so opening a
+    graph only reads the header; array pages are loaded when first touched and
+    strings are decoded on demand.
+    """
+
+    def __init__(self, header, arrays):
+        self.header = header
+        self.directed = header.get('directed', False)
+        self.string_offsets = arrays['string_offsets']
+        self.string_data = arrays['string_data']
+        self.node_id = arrays['node_id']
+        self.node_label = arrays['node_label']
+        self.node_importance = arrays['node_importance']
+        self.edge_source = arrays['edge_source']
+        self.edge_target = arrays['edge_target']
+        self.edge_label = arrays['edge_label']
+        self._string_cache = {}
+
+    @property
+    def number_of_nodes(self):
+        return len(self.node_id)
+
+    @property
+    def number_of_edges(self):
+        return len(self.edge_source)
+
+    def string(self, index):
+        """
+        Decode one interned string.
+
+        Args:
+        index (int): Index into the string table.
+
+        Returns:
+        str: The decoded string.
+        """
+        index = int(index)
+        value = self._string_cache.get(index)
+        if value is None:
+            start, end = int(self.string_offsets[index]), int(self.string_offsets[index + 1])
+            value = self.string_data[start:end].tobytes().decode('utf-8')
+            self._string_cache[index] = value
+        return value
+
+    def node_ids(self):
+        return [self.string(i) for i in self.node_id]
+
+    def _typed_node_ids(self):
+        ids = self.node_ids()
+        if self.header.get('node_id_type') == 'int':
+            return [int(node) for node in ids]
+        return ids
+
+    def node_labels(self):
+        return [self.string(i) for i in self.node_label]
+
+    def edges(self):
+        """
+        Iterate over edges as (source node id, target node id, label) tuples.
+        """
+        ids = self._typed_node_ids()
+        for source, target, label in zip(self.edge_source.tolist(), self.edge_target.tolist(), self.edge_label.tolist()):
+            yield ids[source], ids[target], self.string(label)
+
+    def strings(self):
+        """
+        Decode the whole string table at once, which is much cheaper than
+        decoding labels one by one when every node and edge is needed.
+
+        Returns:
+        list: All interned strings, indexed by string id.
+        """
+        data = self.string_data.tobytes()
+        offsets = self.string_offsets.tolist()
+        return [data[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+
+    def to_networkx(self):
+        """
+        Rebuild a networkx graph with the same attributes create_knowledge_graph sets.
+
+        Returns:
+        networkx.Graph or networkx.DiGraph: The reconstructed graph.
+        """
+        import networkx as nx
+
+        strings = self.strings()
+        ids = [strings[i] for i in self.node_id.tolist()]
+        if self.header.get('node_id_type') == 'int':
+            ids = [int(node) for node in ids]
+
+        G = nx.DiGraph() if self.directed else nx.Graph()
+        G.add_nodes_from(
+            (node, {'label': strings[label], 'importance': _restore_number(importance)})
+            for node, label, importance in zip(ids, self.node_label.tolist(), self.node_importance.tolist())
+        )
+        G.add_edges_from(
+            (ids[source], ids[target], {'label': strings[label]})
+            for source, target, label in zip(self.edge_source.tolist(), self.edge_target.tolist(), self.edge_label.tolist())
+        )
+        return G
+
+
+def canonical_label(label):
+    # "Large Language Models (LLMs)" and "large-language models" should merge into one entity;
+    # shared by the graph stage (merging) and GraphQuery.py (lookups)
+    label = re.sub(r'\([^)]*\)', ' ', str(label).lower())
+    return re.sub(r'[^\w]+', ' ', label).strip()
+
+
+def _restore_number(value):
+    # Importance comes from the LLM as an integer 1-5; keep it an int when it round-trips exactly
+    return int(value) if float(value).is_integer() else value
+
+
+def _importance(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def graph_to_arrays(G):
+    """
+    Convert a networkx graph into the interned, array-backed representation.
+
+    Args:
+    G (networkx.Graph): Graph with 'label' and 'importance' node attributes and 'label' edge attributes.
+
+    Returns:
+    dict: Array name -> numpy array.
+
+    Raises:
+    ValueError: If two node ids have the same string form.
+    """
+    strings = StringTable()
+    node_index = {}
+    stored_ids = {}  # String id -> node, to catch distinct ids that are stored alike (1 and '1')
+    node_id, node_label, node_importance = [], [], []
+
+    for node, data in G.nodes(data=True):
+        node_index[node] = len(node_id)
+        string_id = strings.intern(node)
+        if string_id in stored_ids:
+            raise ValueError(f"Node ids {stored_ids[string_id]!r} and {node!r} would both be stored as {str(node)!r}")
+        stored_ids[string_id] = node
+        node_id.append(string_id)
+        node_label.append(strings.intern(data.get('label', node)))
+        node_importance.append(_importance(data.get('importance')))
+
+    edge_source, edge_target, edge_label = [], [], []
+    for source, target, data in G.edges(data=True):
+        edge_source.append(node_index[source])
+        edge_target.append(node_index[target])
+        edge_label.append(strings.intern(data.get('label', '')))
+
+    string_offsets, string_data = strings.to_arrays()
+    return {
+        'string_offsets': string_offsets,
+        'string_data': string_data,
+        'node_id': np.asarray(node_id, dtype=ARRAY_DTYPES['node_id']),
+        'node_label': np.asarray(node_label, dtype=ARRAY_DTYPES['node_label']),
+        'node_importance': np.asarray(node_importance, dtype=ARRAY_DTYPES['node_importance']),
+        'edge_source': np.asarray(edge_source, dtype=ARRAY_DTYPES['edge_source']),
+        'edge_target': np.asarray(edge_target, dtype=ARRAY_DTYPES['edge_target']),
+        'edge_label': np.asarray(edge_label, dtype=ARRAY_DTYPES['edge_label']),
+    }
+
+
+def save_graph(G, path, metadata=None):
+    """
+    Save a knowledge graph to a .kgb file.
+
+    The file is written to a temporary name and renamed into place so readers
+    never see a partially written graph.
+
+    Args:
+    G (networkx.Graph): The graph to save.
+    path (str): Destination path.
+    metadata (dict, optional): Extra JSON-serialisable information stored in the header.
+
+    Raises:
+    ValueError: If two node ids have the same string form, e.g. 1 and '1'.
+    """
+    # LLM responses use either integer or string entity ids; remember which so they round-trip.
+    # bool is an int subclass, but str(True) cannot be read back with int()
+    is_integer = lambda node: isinstance(node, (int, np.integer)) and not isinstance(node, bool)
+    node_id_type = 'int' if G.number_of_nodes() and all(is_integer(node) for node in G.nodes) else 'str'
+    save_arrays(graph_to_arrays(G), path, G.is_directed(), node_id_type, metadata)
+
+
+def save_arrays(arrays, path, directed=False, node_id_type='str', metadata=None):
+    """
+    Write the array representation of a graph (see graph_to_arrays) to a .kgb file.
+
+    Useful for graphs built without networkx, such as large synthetic benchmark graphs.
+
+    Args:
+    arrays (dict): Array name -> numpy array, for every name in ARRAY_DTYPES.
+    path (str): Destination path.
+    directed (bool): Whether edges are directed.
+    node_id_type (str): 'int' or 'str', the type node ids are restored as.
+    metadata (dict, optional): Extra JSON-serialisable information stored in the header.
+    """
+    layout = {}
+    offset = 0
+    for name in ARRAY_DTYPES:
+        array = arrays[name]
+        offset = _align(offset)
+        layout[name] = {'dtype': ARRAY_DTYPES[name], 'offset': offset, 'length': int(array.size)}
+        offset += array.size * np.dtype(ARRAY_DTYPES[name]).itemsize
+
+    header = {
+        'version': 1,
+        'directed': bool(directed),
+        'node_id_type': node_id_type,
+        'nodes': int(arrays['node_id'].size),
+        'edges': int(arrays['edge_source'].size),
+        'arrays': layout,
+        'metadata': metadata or {},
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    data_start = _align(len(MAGIC) + 4 + len(header_bytes))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as fp:
+        fp.write(MAGIC)
+        fp.write(struct.pack('<I', len(header_bytes)))
+        fp.write(header_bytes)
+        fp.write(b'\0' * (data_start - fp.tell()))
+        for name in ARRAY_DTYPES:
+            fp.write(b'\0' * (data_start + layout[name]['offset'] - fp.tell()))
+            fp.write(np.ascontiguousarray(arrays[name], dtype=ARRAY_DTYPES[name]).tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_header(path):
+    """
+    Read only the JSON header of a .kgb file.
+
+    Args:
+    path (str): Path to the stored graph.
+
+    Returns:
+    tuple: (header dict, byte offset where array data starts)
+    """
+    with open(path, 'rb') as fp:
+        if fp.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a knowledge graph store file")
+        (header_length,) = struct.unpack('<I', fp.read(4))
+        header = json.loads(fp.read(header_length).decode('utf-8'))
+    return header, _align(len(MAGIC) + 4 + header_length)
+
+
+def load_graph(path, mmap=True):
+    """
+    Open a stored knowledge graph.
+
+    Args:
+    path (str): Path to the .kgb file.
+    mmap (bool): Memory-map the file instead of reading it into memory.
+
+    Returns:
+    CompactGraph: Lazy view over the stored arrays.
+    """
+    header, data_start = read_header(path)
+    if mmap:
+        buffer = np.memmap(path, dtype='u1', mode='r')
+    else:
+        with open(path, 'rb') as fp:
+            buffer = np.frombuffer(fp.read(), dtype='u1')
+
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        start = data_start + spec['offset']
+        arrays[name] = buffer[start:start + spec['length'] * dtype.itemsize].view(dtype)
+    return CompactGraph(header, arrays)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 2:
+        print("Usage: python GraphStore.py <graph.kgb>")
+        sys.exit(1)
+    graph = load_graph(sys.argv[1])
+    print(f"Nodes: {graph.number_of_nodes}, Edges: {graph.number_of_edges}")
+    for node, label, importance in zip(graph.node_ids(), graph.node_labels(), graph.node_importance.tolist()):
+        print(f"{node}\t{importance:g}\t{label}")
@@ -1,13 +1,23 @@
 # Groq.py
 # This script generates summaries from text content using the Groq API with the llama3.1-70b model.
 # It reads a text file, sends the content to Groq for summarization, and saves the result.
+# The summary is checkpointed as soon as it arrives (see Checkpoint.py), so a retry after a timeout
+# never pays for the same completion twice.
+# With several SUMMARY_LANGUAGES, the paper is summarised once in the first language and the other
+# languages are translated concurrently from that short summary instead of from the full paper.
 
 # Required packages:
 # pip install groq python-dotenv
 
+import json
 import os
-from groq import Groq
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from LLMClient import get_groq_client
+from Checkpoint import Checkpoint, fingerprint
+from DocumentModel import parse_section_names, read_paper_text
+from Compressor import compress_for_llm
+from Profiler import profile_stage, profiled_worker
 
 # Load environment variables from .env file
 load_dotenv()
@@ -17,13 +27,21 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 MODEL = os.getenv("GROQ_MODEL")
 PROMPT_TEMPLATE = os.getenv("PROMPT_TEMPLATE")
 INPUT_TEXT_FILE = "pdf_to_text_temp.txt"  
-OUTPUT_FILE = os.getenv("OUTPUT_FILE")
+OUTPUT_FILE = os.getenv("OUTPUT_FILE", "output.txt")
+# The summary alone; OUTPUT_FILE additionally receives the citations from ReferenceGenerator.py
+SUMMARY_FILE = os.getenv("SUMMARY_FILE", "summary.txt")
 DEFAULT_LANGUAGE = os.getenv("DEFAULT_SUMMARY_LANGUAGE")
+# Comma-separated languages, e.g. "English,Chinese"; the first one is summarised from the paper
+SUMMARY_LANGUAGES = [language.strip() for language in os.getenv("SUMMARY_LANGUAGES", "").split(",") if language.strip()] or [DEFAULT_LANGUAGE]
+# Every language's summary as a JSON object {language: summary}
+SUMMARIES_FILE = os.getenv("SUMMARIES_FILE", "summaries.json")
+TRANSLATION_PROMPT_TEMPLATE = os.getenv("TRANSLATION_PROMPT_TEMPLATE", (
+    "Translate the following LinkedIn post from {source_language} into {language}. Keep its structure, "
+    "tone and technical terms, and provide only the translated post without explanations.\n\n{content}"))
 DEFAULT_TEMPERATURE = float(os.getenv("DEFAULT_TEMPERATURE"))
 DEFAULT_MAX_TOKENS = min(int(os.getenv("DEFAULT_MAX_TOKENS", "4000")), 8000)
-
-# Create Groq client
-client = Groq(api_key=GROQ_API_KEY)
+# Sections sent to the LLM when PDFParser ran in structured mode, e.g. "title,abstract,introduction,conclusion"
+SUMMARY_SECTIONS = parse_section_names(os.getenv("SUMMARY_SECTIONS"))
 
 def read_text_content(file_path):
     """
@@ -38,12 +56,13 @@ def read_text_content(file_path):
     with open(file_path, 'r', encoding='utf-8') as file:
         return file.read()
 
-def generate_summary(content):
+def generate_summary(content, language=DEFAULT_LANGUAGE):
     """
     Generate a summary using the Groq API.
     
     Args:
     content (str): The text content to summarize.
+    language (str): Language of the summary.
     
     Returns:
     str: The generated summary.
@@ -53,11 +72,11 @@ def generate_summary(content):
     """
     messages = [
         {"role": "system", "content": "You are a helpful assistant."},
-        {"role": "user", "content": PROMPT_TEMPLATE.format(language=DEFAULT_LANGUAGE, content=content)}
+        {"role": "user", "content": PROMPT_TEMPLATE.format(language=language, content=content)}
     ]
     
     try:
-        response = client.chat.completions.create(
+        response = get_groq_client(GROQ_API_KEY).chat.completions.create(
             model=MODEL,
             messages=messages,
             temperature=DEFAULT_TEMPERATURE,
@@ -67,6 +86,70 @@ def generate_summary(content):
     except Exception as e:
         raise Exception(f"Error: {str(e)}")
 
+def translate_summary(summary, language, source_language):
+    """
+    Translate a generated summary into another language.
+
+    Args:
+    summary (str): Summary in source_language.
+    language (str): Target language.
+    source_language (str): Language of the summary.
+
+    Returns:
+    str: The translated summary.
+
+    Raises:
+    Exception: If there's an error in the API call.
+    """
+    messages = [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": TRANSLATION_PROMPT_TEMPLATE.format(
+            language=language, source_language=source_language, content=summary)}
+    ]
+
+    try:
+        response = get_groq_client(GROQ_API_KEY).chat.completions.create(
+            model=MODEL,
+            messages=messages,
+            temperature=DEFAULT_TEMPERATURE,
+            max_tokens=DEFAULT_MAX_TOKENS
+        )
+        return response.choices[0].message.content
+    except Exception as e:
+        raise Exception(f"Error translating summary into {language}: {str(e)}")
+
+def fan_out_summary(summary, languages, checkpoint):
+    """
+    Produce the summary in every language, translating concurrently from the canonical one.
+
+    Args:
+    summary (str): Canonical summary in languages[0].
+    languages (list): Requested languages.
+    checkpoint (Checkpoint): Records finished translations so a retry only redoes missing ones.
+
+    Returns:
+    dict: {language: summary}, in the order of languages.
+    """
+    source_language = languages[0]
+
+    def translate(language):
+        step = f"translation:{language}"
+        if step not in checkpoint:
+            checkpoint.put(step, translate_summary(summary, language, source_language))
+        return checkpoint.get(step)
+
+    with ThreadPoolExecutor(max_workers=max(1, len(languages) - 1)) as executor:
+        translations = list(executor.map(profiled_worker(translate), languages[1:]))
+    return dict(zip(languages, [summary] + translations))
+
+def combine_summaries(summaries):
+    """
+    Join the summaries into the single text delivered to users; one language is returned unchanged.
+    """
+    if len(summaries) == 1:
+        return next(iter(summaries.values()))
+    return "\n\n".join(f"[{language}]\n\n{summary}" for language, summary in summaries.items())
+
 def save_summary(summary, output_file):
     """
     Save the generated summary to a file.
@@ -80,13 +163,28 @@ def save_summary(summary, output_file):
 
 def main():
     # Read text content
-    text_content = read_text_content(INPUT_TEXT_FILE)
+    text_content = read_paper_text(INPUT_TEXT_FILE, SUMMARY_SECTIONS)
+    with profile_stage('Groq.compress'):
+        text_content = compress_for_llm(text_content)
+    
+    # Generate summary, unless an interrupted attempt already received it
+    settings = [MODEL, PROMPT_TEMPLATE, TRANSLATION_PROMPT_TEMPLATE, DEFAULT_TEMPERATURE, DEFAULT_MAX_TOKENS]
+    checkpoint = Checkpoint('Groq', fingerprint(text_content, settings, SUMMARY_LANGUAGES[0]))
+    summary = checkpoint.get('summary')
+    if summary is None:
+        with profile_stage('Groq.generate_summary'):
+            summary = checkpoint.put('summary', generate_summary(text_content, SUMMARY_LANGUAGES[0]))
     
-    # Generate summary
-    summary = generate_summary(text_content)
+    with profile_stage('Groq.translate_summary'):
+        summaries = fan_out_summary(summary, SUMMARY_LANGUAGES, checkpoint)
     
     # Save summary
-    save_summary(summary, OUTPUT_FILE)
+    with open(SUMMARIES_FILE, 'w', encoding='utf-8') as file:
+        json.dump(summaries, file, ensure_ascii=False, indent=2)
+    combined = combine_summaries(summaries)
+    save_summary(combined, SUMMARY_FILE)
+    save_summary(combined, OUTPUT_FILE)
+    checkpoint.clear()
     
     print(f"Summary generated and saved to {OUTPUT_FILE}")
 
@@ -0,0 +1,26 @@
+# LLMClient.py
+# This script builds the Groq API client on first use and keeps one client per API key,
+# so importing a stage does not pay for the groq SDK import and pre-warmed workers
+# (see WorkerPool.py) can build the client once and reuse it for every job.
+
+# Required packages:
+# pip install groq
+
+_clients = {}
+
+def get_groq_client(api_key):
+    """
+    Return a cached Groq client for the given API key.
+
+    Args:
+    api_key (str): Groq API key.
+
+    Returns:
+    groq.Groq: The client.
+    """
+    client = _clients.get(api_key)
+    if client is None:
+        from groq import Groq
+
+        client = _clients[api_key] = Groq(api_key=api_key)
+    return client
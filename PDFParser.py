@@ -2,15 +2,25 @@
 # This script converts a PDF file to text, extracting its content while removing references.
 # It uses PyMuPDF to convert PDF to HTML, then BeautifulSoup to parse the HTML and extract text.
 # The process involves creating a temporary HTML file which is deleted after text extraction.
+# In structured mode (PDF_PARSE_MODE=structured) it instead reads PyMuPDF's block and font metadata
+# to build a section model (see DocumentModel.py) so later stages can send only the sections they need.
+# In lazy mode (PDF_PARSE_MODE=lazy) pages are read one at a time and extraction stops once
+# PDF_TOKEN_BUDGET tokens of text are collected or the bibliography or appendix begins; image-only
+# pages are skipped without rendering, and the number of pages actually touched is reported.
+# Every page read is checkpointed (see Checkpoint.py), so a parse cut off by its timeout resumes at
+# the first unread page when run.py retries it.
 
 # Required libraries:
 # pip install PyMuPDF beautifulsoup4 tqdm python-dotenv requests
 
-import fitz
-from tqdm import tqdm
-from bs4 import BeautifulSoup
 import os
+import re
+from collections import Counter
 from dotenv import load_dotenv
+from Checkpoint import Checkpoint, file_fingerprint, fingerprint
+from Compressor import estimate_tokens
+from DocumentModel import SECTIONS_PATH, new_document, save_sections
+from Profiler import profile_stage
 
 # Load the .env file
 load_dotenv()
@@ -19,30 +29,295 @@ load_dotenv()
 INPUT_PDF_PATH = os.getenv('INPUT_PDF_PATH', 'input.pdf')
 HTML_PATH = 'temp.html'
 OUTPUT_TXT_PATH = 'pdf_to_text_temp.txt'
+PDF_PARSE_MODE = os.getenv('PDF_PARSE_MODE', 'flat').lower()  # flat, structured or lazy
+# Lazy mode stops reading pages once this many tokens of text are collected (0 = no budget)
+PDF_TOKEN_BUDGET = int(os.getenv('PDF_TOKEN_BUDGET', '12000'))
+
+# A bibliography heading is a short line of its own, optionally numbered ("7 References", "VII. REFERENCES")
+REFERENCES_HEADING = re.compile(r'^\s*(?:[\dIVX]+\.?\s+)?(?:References|Bibliography)\s*$', re.IGNORECASE)
+NUMBERED_HEADING = re.compile(r'^\s*(?:\d+(?:\.\d+)*\.?|[IVX]+\.|[A-H](?:\.\d+)*\.?)\s+[A-Z]')
+KNOWN_HEADINGS = re.compile(r'^\s*(?:\d+\.?\s+)?(?:Abstract|Introduction|Related Work|Background|Methods?|Methodology|'
+                            r'Experiments?|Results|Discussion|Conclusions?|Limitations|Acknowledge?ments?|Appendix)\b', re.IGNORECASE)
+ABSTRACT_HEADING = re.compile(r'^\s*Abstract\b\s*[.:\u2014-]?\s*', re.IGNORECASE)
+APPENDIX_HEADING = re.compile(r'^\s*(?:Appendix|Supplementary)', re.IGNORECASE)
+LETTERED_HEADING = re.compile(r'^\s*[A-H](?:\.\d+)*\.?\s+[A-Z]')  # "A Proofs", "B.2 Setup"
+CAPTION = re.compile(r'^\s*(?:Figure|Fig\.|Table)\s*\d+\s*[:.|]')
+MAX_HEADING_WORDS = 12
+MAX_STOP_HEADING_WORDS = 6  # "Appendix A Proofs" is a heading, "Appendix A shows that ..." is body text
+FONT_SIZE = re.compile(r'font-size:\s*([\d.]+)pt')
 
 # Convert PDF to HTML
-def pdf2html(input_path, html_path):
+def pdf2html(input_path, html_path, checkpoint=None):
+    import fitz
+    from tqdm import tqdm
+
+    # Text-only HTML: html2txt ignores images, and embedding them as base64 made each page (and its
+    # checkpoint) many times larger and slower to produce
+    html_flags = fitz.TEXTFLAGS_HTML & ~fitz.TEXT_PRESERVE_IMAGES
+    pages = []
     with fitz.open(input_path) as doc:
-        html_content = ''.join(page.get_text('html') for page in tqdm(doc))
+        for page_number in tqdm(range(doc.page_count)):
+            step = f"html:{page_number}"
+            if checkpoint is not None and step in checkpoint:
+                pages.append(checkpoint.get(step))
+                continue
+            page_html = doc[page_number].get_text('html', flags=html_flags)
+            if checkpoint is not None:
+                checkpoint.put(step, page_html)
+            pages.append(page_html)
+    html_content = ''.join(pages)
     html_content += "</body></html>"
     with open(html_path, 'w', encoding='utf-8', newline='') as fp:
         fp.write(html_content)
 
+def is_stop_heading(line, bold=False, size=0, body_size=None):
+    # The bibliography or the appendix begins: nothing after it is needed for the summary or graph.
+    # Appendix headings must also be set as headings (bold, or larger than the body text), since a
+    # wrapped body line such as "Appendix B for the full proof" starts with the same words.
+    line = line.strip()
+    if REFERENCES_HEADING.match(line):
+        return True
+    if (APPENDIX_HEADING.match(line) is None or len(line.split()) > MAX_STOP_HEADING_WORDS
+            or line.endswith(('.', ','))):
+        return False
+    return bold or (body_size is not None and size > body_size + 0.5)
+
+def read_page_lines(page, textpage):
+    """
+    Returns:
+    tuple: (page text, characters per font size, [text, bold, size] of the lines that start a text block)
+    """
+    lines = []
+    sizes = Counter()
+    block_starts = []
+    for block in page.get_text('dict', textpage=textpage)['blocks']:
+        if block.get('type') != 0:
+            continue  # Image block
+        for position, line in enumerate(block['lines']):
+            spans = [span for span in line['spans'] if span['text'].strip()]
+            if not spans:
+                continue
+            text = ''.join(span['text'] for span in line['spans']).strip()
+            lines.append(text)
+            for span in spans:
+                sizes[round(span['size'], 1)] += len(span['text'])
+            if position == 0:
+                block_starts.append([text, all(span['flags'] & 16 for span in spans), max(span['size'] for span in spans)])
+    return '\n'.join(lines), sizes, block_starts
+
+# Convert PDF to HTML page by page, only as far as the later stages need
+def pdf2html_lazy(input_path, html_path, token_budget=PDF_TOKEN_BUDGET, checkpoint=None):
+    """
+    Returns:
+    dict: Pages in the document, pages touched, image-only pages skipped, tokens kept and why reading stopped.
+    """
+    import fitz
+
+    # Text-only HTML, as in pdf2html
+    html_flags = fitz.TEXTFLAGS_HTML & ~fitz.TEXT_PRESERVE_IMAGES
+    pages = []
+    report = {'pages': 0, 'touched': 0, 'skipped': 0, 'tokens': 0, 'stopped_at': 'end of document'}
+    size_weights = Counter()
+    with fitz.open(input_path) as doc:
+        report['pages'] = doc.page_count
+        for page_number in range(doc.page_count):
+            step = f"page:{page_number}"
+            if checkpoint is not None and step in checkpoint:
+                record = checkpoint.get(step)
+            else:
+                page = doc[page_number]
+                textpage = page.get_textpage(flags=html_flags)  # Layout is analysed once for text and HTML
+                text, sizes, block_starts = read_page_lines(page, textpage)
+                if not text.strip():
+                    record = {'html': None}  # Image-only page
+                else:
+                    record = {
+                        'html': page.get_text('html', textpage=textpage),
+                        'tokens': estimate_tokens(text),
+                        'sizes': [[size, count] for size, count in sizes.items()],
+                        # Only lines starting a block can be headings; their style is judged below
+                        'headings': [line for line in block_starts if is_stop_heading(line[0], bold=True)],
+                    }
+                if checkpoint is not None:
+                    checkpoint.put(step, record)
+
+            report['touched'] = page_number + 1
+            if record['html'] is None:
+                report['skipped'] += 1
+                continue
+            pages.append(record['html'])
+            report['tokens'] += record['tokens']
+            # The body font is the size carrying the most characters on the pages read so far
+            size_weights.update({size: count for size, count in record['sizes']})
+            body_size = size_weights.most_common(1)[0][0]
+            if any(is_stop_heading(text, bold, size, body_size) for text, bold, size in record['headings']):
+                report['stopped_at'] = 'bibliography or appendix'
+                break
+            if token_budget and report['tokens'] >= token_budget:
+                report['stopped_at'] = f"token budget of {token_budget}"
+                break
+
+    with open(html_path, 'w', encoding='utf-8', newline='') as fp:
+        fp.write(''.join(pages) + "</body></html>")
+    return report
+
 # Parse local HTML using BeautifulSoup and extract text
-def html2txt(html_path, output_path):
+def html2txt(html_path, output_path, stop_at_appendix=False):
+    from bs4 import BeautifulSoup
+
     with open(html_path, 'r', encoding='utf-8') as html_file, open(output_path, 'w', encoding='utf-8') as text_file:
         soup = BeautifulSoup(html_file, "html.parser")
+        body_size = None
+        if stop_at_appendix:
+            # The body font is the size carrying the most characters
+            size_weights = Counter()
+            for span in soup.find_all('span'):
+                size_weights[span_size(span)] += len(span.text)
+            body_size = size_weights.most_common(1)[0][0] if size_weights else None
         for div in soup.find_all('div'):
             for p in div.children:
+                spans = []
                 if isinstance(p, str):
                     text = p.strip()
                 else:
-                    text = ''.join(span.text for span in p.find_all('span') if span.text)
+                    spans = [span for span in p.find_all('span') if span.text]
+                    text = ''.join(span.text for span in spans)
                 if text:
-                    if "References" in text:
-                        return  # Stop processing when "References" is encountered
+                    if REFERENCES_HEADING.match(text):
+                        return  # Stop processing at the bibliography heading
+                    if stop_at_appendix and spans:
+                        bold = all(span.find_parent('b') is not None for span in spans)
+                        if is_stop_heading(text, bold, max(span_size(span) for span in spans), body_size):
+                            return
                     text_file.write(text + '\n')
 
+def span_size(span):
+    match = FONT_SIZE.search(span.get('style', ''))
+    return float(match.group(1)) if match else 0.0
+
+# Read text blocks with their font size and boldness from every page
+def read_blocks(input_path, checkpoint=None):
+    import fitz
+    from tqdm import tqdm
+
+    blocks = []
+    with fitz.open(input_path) as doc:
+        for page_number in tqdm(range(doc.page_count)):
+            step = f"blocks:{page_number}"
+            if checkpoint is not None and step in checkpoint:
+                blocks.extend(checkpoint.get(step))
+                continue
+            page_blocks = []
+            for block in doc[page_number].get_text('dict')['blocks']:
+                if block.get('type') != 0:
+                    continue  # Image block
+                lines = []
+                sizes = Counter()
+                bold = True
+                for line in block['lines']:
+                    line_text = ''.join(span['text'] for span in line['spans']).strip()
+                    if line_text:
+                        lines.append(line_text)
+                    for span in line['spans']:
+                        if span['text'].strip():
+                            sizes[round(span['size'], 1)] += len(span['text'])
+                            bold = bold and bool(span['flags'] & 16)
+                text = ' '.join(lines)
+                if text and sizes:
+                    page_blocks.append({'page': page_number, 'text': text, 'size': sizes.most_common(1)[0][0], 'bold': bold})
+            if checkpoint is not None:
+                checkpoint.put(step, page_blocks)
+            blocks.extend(page_blocks)
+    return blocks
+
+def is_heading(block, body_size):
+    text = block['text']
+    if len(text.split()) > MAX_HEADING_WORDS:
+        return False
+    if text.endswith(('.', ',')) and not NUMBERED_HEADING.match(text):
+        return False  # Short sentence rather than a heading
+    if block['size'] > body_size + 0.5:
+        return True
+    return block['bold'] and (NUMBERED_HEADING.match(text) or KNOWN_HEADINGS.match(text)) is not None
+
+# Build the section model from PyMuPDF block and font-size metadata
+def pdf2sections(input_path, checkpoint=None):
+    blocks = read_blocks(input_path, checkpoint)
+    document = new_document()
+    if not blocks:
+        return document
+
+    # The body font is the size carrying the most characters
+    size_weights = Counter()
+    for block in blocks:
+        size_weights[block['size']] += len(block['text'])
+    body_size = size_weights.most_common(1)[0][0]
+
+    # The title is the largest text on the first page
+    first_page = [block for block in blocks if block['page'] == 0]
+    title_block = max(first_page or blocks, key=lambda block: block['size'])
+    if title_block['size'] > body_size:
+        document['title'] = title_block['text']
+
+    front_matter = []
+    current = None  # Section receiving body text; None while still in the front matter
+    in_abstract = False
+    in_references = False
+    for block in blocks:
+        if block is title_block and document['title']:
+            continue
+        text = block['text']
+        if text.isdigit():
+            continue  # Page number
+
+        if CAPTION.match(text):
+            document['captions'].append(text)
+            continue
+
+        if is_heading(block, body_size) or ABSTRACT_HEADING.match(text) and len(text.split()) <= 2:
+            in_abstract = ABSTRACT_HEADING.match(text) is not None and len(text.split()) <= 2
+            if in_abstract:
+                continue
+            if REFERENCES_HEADING.match(text):
+                in_references = True
+                continue
+            # Anything after the bibliography, or from the first appendix heading on, is appendix material
+            after_appendix = current is not None and current['kind'] == 'appendix'
+            # Lettered headings only mark appendices once the body has used numbered ones
+            lettered = LETTERED_HEADING.match(text) and any(section['heading'][:1].isdigit() for section in document['sections'])
+            kind = 'appendix' if in_references or after_appendix or lettered or APPENDIX_HEADING.match(text) else 'body'
+            in_references = False
+            current = {'heading': text, 'kind': kind, 'text': ''}
+            document['sections'].append(current)
+            continue
+
+        if in_references:
+            document['references'].append(text)
+        elif in_abstract or (current is None and ABSTRACT_HEADING.match(text)):
+            # Abstract either follows its own heading or starts inline ("Abstract—We propose ...")
+            abstract = ABSTRACT_HEADING.sub('', text) if not in_abstract else text
+            document['abstract'] = f"{document['abstract']} {abstract}".strip()
+            in_abstract = True
+        elif current is None:
+            front_matter.append(text)
+        else:
+            current['text'] = f"{current['text']}\n{text}".strip()
+
+    document['front_matter'] = '\n'.join(front_matter)
+    return document
+
+# Write the text later stages read by default: everything except captions, references and appendices
+def sections2txt(document, output_path):
+    with open(output_path, 'w', encoding='utf-8') as text_file:
+        for part in (document['title'], document['front_matter'], document['abstract']):
+            if part:
+                text_file.write(part + '\n')
+        for section in document['sections']:
+            if section['kind'] == 'body':
+                text_file.write(section['heading'] + '\n')
+                if section['text']:
+                    text_file.write(section['text'] + '\n')
+
 # Delete the temporary HTML file
 def delete_html_file(html_path):
     try:
@@ -53,9 +328,31 @@ def delete_html_file(html_path):
 
 # Main function
 def main():
-    pdf2html(INPUT_PDF_PATH, HTML_PATH)
-    html2txt(HTML_PATH, OUTPUT_TXT_PATH)
-    delete_html_file(HTML_PATH)
+    checkpoint = Checkpoint('PDFParser', fingerprint(file_fingerprint(INPUT_PDF_PATH), PDF_PARSE_MODE, PDF_TOKEN_BUDGET))
+    if PDF_PARSE_MODE == 'structured':
+        with profile_stage('PDFParser.pdf2sections'):
+            document = pdf2sections(INPUT_PDF_PATH, checkpoint)
+        save_sections(document, SECTIONS_PATH)
+        sections2txt(document, OUTPUT_TXT_PATH)
+        print(f"Found {len(document['sections'])} sections, {len(document['captions'])} captions "
+              f"and {len(document['references'])} references; section model saved to {SECTIONS_PATH}")
+    else:
+        if PDF_PARSE_MODE == 'lazy':
+            with profile_stage('PDFParser.pdf2html_lazy'):
+                report = pdf2html_lazy(INPUT_PDF_PATH, HTML_PATH, checkpoint=checkpoint)
+            print(f"Lazy extraction touched {report['touched']} of {report['pages']} pages "
+                  f"({report['skipped']} image-only pages skipped, ~{report['tokens']} tokens kept); "
+                  f"stopped at {report['stopped_at']}")
+        else:
+            with profile_stage('PDFParser.pdf2html'):
+                pdf2html(INPUT_PDF_PATH, HTML_PATH, checkpoint)
+        with profile_stage('PDFParser.html2txt'):
+            html2txt(HTML_PATH, OUTPUT_TXT_PATH, stop_at_appendix=PDF_PARSE_MODE == 'lazy')
+        delete_html_file(HTML_PATH)
+        # Do not let later stages pick up a section model from an earlier structured run
+        if os.path.exists(SECTIONS_PATH):
+            os.remove(SECTIONS_PATH)
+    checkpoint.clear()
     print(f"PDF content has been extracted to {OUTPUT_TXT_PATH}")
 
 if __name__ == "__main__":
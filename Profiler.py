@@ -0,0 +1,227 @@
+# Profiler.py
+# This script provides an on-demand profiling switch for the pipeline stages.
+# When PROFILE=True, each wrapped stage is run under cProfile, tracemalloc and a stack sampler,
+# and these reports are written to PROFILE_DIR:
+#   <stage>.pstats      cProfile statistics (open with pstats or snakeviz)
+#   <stage>.txt         top functions by cumulative time
+#   <stage>.collapsed   sampled stacks in collapsed format for flamegraph.pl / speedscope
+#   <stage>.alloc.txt   peak traced memory and top allocating lines
+# When PROFILE is not set, profile_stage is a no-op context manager.
+# Only one stage is profiled at a time: a stage entered while another is active (nested, or on
+# another thread) records just its wall time, since a second cProfile would stop the first one
+# (or fail outright on Python 3.12+) and resetting the memory peak would corrupt the outer report.
+# cProfile and the sampler follow the thread that entered the stage; functions the stage runs on
+# worker threads (ThreadPoolExecutor.map) are wrapped with profiled_worker so their work is
+# profiled on those threads and merged into the stage's reports.
+
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROFILE = os.getenv('PROFILE', 'False').lower() in ('true', '1')
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))  # Seconds
+TOP_FUNCTIONS = 40
+TOP_ALLOCATORS = 25
+
+_active_stages = []  # Stages currently being profiled, outermost first
+_active_lock = threading.Lock()
+_worker_session = None  # (worker profiles, sampler) of the stage being profiled, for profiled_worker
+
+class StackSampler:
+    """
+    Periodically records the stacks of a set of threads and counts identical stacks.
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_SAMPLE_INTERVAL):
+        self.thread_ids = {thread_id}
+        self.interval = interval
+        self.stacks = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def add_thread(self, thread_id):
+        with self._lock:
+            self.thread_ids.add(thread_id)
+
+    def remove_thread(self, thread_id):
+        with self._lock:
+            self.thread_ids.discard(thread_id)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                thread_ids = list(self.thread_ids)
+            frames = sys._current_frames()
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[';'.join(reversed(stack))] += 1
+
+    def write_collapsed(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+def _report_path(stage, suffix, directory):
+    # Stages can run more than once per job (e.g. retries); never overwrite an earlier report
+    base = os.path.join(directory, stage)
+    path, attempt = f"{base}{suffix}", 1
+    while os.path.exists(path):
+        attempt += 1
+        path = f"{base}-{attempt}{suffix}"
+    return path
+
+def _write_reports(stage, directory, profiler, worker_profilers, sampler, snapshot, peak):
+    os.makedirs(directory, exist_ok=True)
+    summary = io.StringIO()
+    stats = pstats.Stats(profiler, stream=summary)
+    for worker_profiler in worker_profilers:
+        stats.add(worker_profiler)
+    stats.dump_stats(_report_path(stage, '.pstats', directory))
+
+    stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    with open(_report_path(stage, '.txt', directory), 'w', encoding='utf-8') as file:
+        file.write(summary.getvalue())
+
+    sampler.write_collapsed(_report_path(stage, '.collapsed', directory))
+
+    with open(_report_path(stage, '.alloc.txt', directory), 'w', encoding='utf-8') as file:
+        file.write(f"Peak traced memory: {peak / 1024:.1f} KB\n\n")
+        for statistic in snapshot.statistics('lineno')[:TOP_ALLOCATORS]:
+            file.write(f"{statistic}\n")
+
+@contextmanager
+def _timed(stage, directory, outer):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        os.makedirs(directory, exist_ok=True)
+        with open(_report_path(stage, '.txt', directory), 'w', encoding='utf-8') as file:
+            file.write(f"Wall time: {elapsed:.3f}s\nProfiled as part of {outer}; see its reports for details.\n")
+        print(f"Timed {stage}: {elapsed:.2f}s (inside profiled {outer})")
+
+@contextmanager
+def _profiled(stage, directory):
+    with _active_lock:
+        outer = _active_stages[0] if _active_stages else None
+        _active_stages.append(stage)
+    try:
+        if outer is not None:
+            with _timed(stage, directory, outer):
+                yield
+        else:
+            with _profiled_exclusive(stage, directory):
+                yield
+    finally:
+        with _active_lock:
+            _active_stages.remove(stage)
+
+@contextmanager
+def _profiled_exclusive(stage, directory):
+    global _worker_session
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    sampler = StackSampler(threading.get_ident())
+    profiler = cProfile.Profile()
+    worker_profilers = []
+    with _active_lock:
+        _worker_session = (worker_profilers, sampler)
+    start = time.perf_counter()
+    sampler.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        with _active_lock:
+            _worker_session = None
+        sampler.stop()
+        elapsed = time.perf_counter() - start
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if started_tracing:
+            tracemalloc.stop()
+        with _active_lock:
+            worker_profilers = list(worker_profilers)  # Workers still running past the stage are left out
+        _write_reports(stage, directory, profiler, worker_profilers, sampler, snapshot, peak)
+        print(f"Profiled {stage}: {elapsed:.2f}s, peak {peak / 1024:.0f} KB; reports in {directory}")
+
+def profiled_worker(function):
+    """
+    Wrap a function that a stage runs on worker threads, e.g. executor.map(profiled_worker(f), items).
+
+    While a stage is profiled, each call runs under its own cProfile and is sampled, and its statistics
+    are merged into the stage's reports. Otherwise the function is called directly.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with _active_lock:
+            session = _worker_session
+        if session is None:
+            return function(*args, **kwargs)
+        worker_profilers, sampler = session
+        thread_id = threading.get_ident()
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            profiler = None  # Python 3.12+: the stage's cProfile already covers every thread
+        sampler.add_thread(thread_id)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            sampler.remove_thread(thread_id)
+            if profiler is not None:
+                profiler.disable()
+                with _active_lock:
+                    worker_profilers.append(profiler)
+    return wrapper
+
+def profile_stage(stage, enabled=None, directory=None):
+    """
+    Profile a block of code when profiling is enabled.
+
+    Usage:
+    with profile_stage('PDFParser.pdf2html'):
+        pdf2html(...)
+
+    Args:
+    stage (str): Report file name prefix.
+    enabled (bool, optional): Overrides the PROFILE environment variable.
+    directory (str, optional): Overrides PROFILE_DIR.
+
+    Returns:
+    A context manager; a plain nullcontext when profiling is off, so unprofiled runs pay nothing.
+    """
+    if not (PROFILE if enabled is None else enabled):
+        return nullcontext()
+    return _profiled(stage, directory or PROFILE_DIR)
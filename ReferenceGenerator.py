@@ -1,53 +1,238 @@
 # ReferenceGenerator.py
-# This script extracts arXiv IDs from a text file, generates citations, and appends them to an output file.
-# Required libraries: arxiv, datetime, re, os
+# This script extracts arXiv IDs from a text file, generates citations, and adds them below the summary in the output file.
+# Metadata is looked up in the offline index (ArxivIndex.py) first, then in an on-disk cache,
+# and only the remaining ids are fetched in batched id_list queries.
+# Required libraries: arxiv, python-dotenv
 
-import arxiv
 import datetime
+import json
 import re
 import os
+import sys
+import time
+from dotenv import load_dotenv
+from ArxivIndex import base_arxiv_id, open_index
+from Profiler import profile_stage
 
-# Extract arXiv ID from text using regex
+load_dotenv()
+
+ARXIV_CACHE_PATH = os.getenv('ARXIV_CACHE_PATH', 'arxiv_cache.json')
+ARXIV_CACHE_TTL = int(os.getenv('ARXIV_CACHE_TTL', str(7 * 24 * 3600)))  # Seconds
+ARXIV_BATCH_SIZE = int(os.getenv('ARXIV_BATCH_SIZE', '100'))
+ARXIV_OFFLINE = os.getenv('ARXIV_OFFLINE', 'False').lower() == 'true'  # Never query the arXiv API
+
+OUTPUT_FILE = os.getenv('OUTPUT_FILE', 'output.txt')
+SUMMARY_FILE = os.getenv('SUMMARY_FILE', 'summary.txt')
+CITATION_FILE = os.getenv('CITATION_FILE', 'citations.txt')
+
+ARXIV_ID_PATTERN = r'arXiv:\s?(\d{4}\.\d{4,5}(?:v\d+)?)'
+
+# Extract the first arXiv ID from text using regex
 def extract_arxiv_id(text):
-    pattern = r'arXiv:(\d{4}\.\d{5}v\d+)'
-    match = re.search(pattern, text)
-    if match:
-        return match.group(1)
-    return None
+    arxiv_ids = extract_arxiv_ids(text)
+    return arxiv_ids[0] if arxiv_ids else None
+
+# Extract every arXiv ID from text, deduplicated and in order of appearance
+def extract_arxiv_ids(text):
+    return list(dict.fromkeys(re.findall(ARXIV_ID_PATTERN, text)))
+
+class CitationLookupError(Exception):
+    """
+    The arXiv API could not be queried; citations holds those resolved without it.
+    """
+
+    def __init__(self, message, citations):
+        super().__init__(message)
+        self.citations = citations
+
+class ArxivClient:
+    """
+    Fetch paper metadata from the arXiv API.
+
+    Any object with a compatible fetch_metadata method can be passed to
+    get_arxiv_citations instead, e.g. a local stand-in in tests.
+    """
+
+    def __init__(self, batch_size=ARXIV_BATCH_SIZE):
+        import arxiv
+
+        self.batch_size = batch_size
+        self.client = arxiv.Client()
+
+    def fetch_metadata(self, arxiv_ids):
+        """
+        Resolve arXiv ids with one id_list query per batch.
+
+        Args:
+        arxiv_ids (list): arXiv ids, with or without version suffix.
+
+        Returns:
+        dict: arXiv id -> {'authors': [...], 'year': int, 'title': str}
+        """
+        import arxiv
+
+        metadata = {}
+        for start in range(0, len(arxiv_ids), self.batch_size):
+            batch = arxiv_ids[start:start + self.batch_size]
+            # arXiv returns versioned ids; map them back to the ids as requested
+            requested = {base_arxiv_id(arxiv_id): arxiv_id for arxiv_id in batch}
+            search = arxiv.Search(id_list=batch, max_results=len(batch))
+            for paper in self.client.results(search):
+                arxiv_id = requested.get(base_arxiv_id(paper.get_short_id()))
+                if arxiv_id is None:
+                    continue
+                metadata[arxiv_id] = {
+                    'authors': [author.name for author in paper.authors],
+                    'year': paper.published.year,
+                    'title': paper.title,
+                }
+        return metadata
+
+class CitationCache:
+    """
+    Persistent JSON cache of arXiv metadata with a time-to-live per entry.
+    """
+
+    def __init__(self, path=ARXIV_CACHE_PATH, ttl=ARXIV_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as file:
+                    self.entries = json.load(file)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable arXiv cache {path}: {e}")
+
+    def get(self, arxiv_id):
+        entry = self.entries.get(arxiv_id)
+        if entry and time.time() - entry['fetched_at'] < self.ttl:
+            return entry['metadata']
+        return None
+
+    def put(self, arxiv_id, metadata):
+        self.entries[arxiv_id] = {'fetched_at': time.time(), 'metadata': metadata}
+
+    def save(self):
+        # Write to a temporary file first so a crash never leaves a truncated cache
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.entries, file, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+# Format a citation from arXiv metadata
+def format_citation(arxiv_id, metadata):
+    authors = ", ".join(metadata['authors'])
+    return f"{authors}. ({metadata['year']}). {metadata['title']}. ArXiv.org. https://arxiv.org/abs/{arxiv_id}"
+
+# Generate citations for several arXiv IDs: offline index first, then the cache, then one batched query.
+# Raises CitationLookupError, carrying the citations that were found, if the arXiv API fails.
+def get_arxiv_citations(arxiv_ids, client=None, cache=None, index=None, offline=ARXIV_OFFLINE):
+    opened_index = open_index() if index is None else None
+    index = index if index is not None else opened_index
+    metadata = {}
+    missing = []
+    try:
+        for arxiv_id in arxiv_ids:
+            indexed = index.get(arxiv_id) if index is not None else None
+            if indexed is not None:
+                metadata[arxiv_id] = indexed
+            else:
+                missing.append(arxiv_id)
+    finally:
+        if opened_index is not None:
+            opened_index.close()
+    error = None
+
+    if missing:
+        cache = cache if cache is not None else CitationCache()
+        uncached = []
+        for arxiv_id in missing:
+            cached = cache.get(arxiv_id)
+            if cached is not None:
+                metadata[arxiv_id] = cached
+            else:
+                uncached.append(arxiv_id)
+
+        if uncached and not offline:
+            client = client if client is not None else ArxivClient()
+            try:
+                fetched = client.fetch_metadata(uncached)
+            except Exception as e:
+                # Keep what the index and cache resolved; the caller decides what a failed lookup costs
+                error = f"Error fetching arXiv metadata for {', '.join(uncached)}: {e}"
+                fetched = {}
+            for arxiv_id, paper in fetched.items():
+                cache.put(arxiv_id, paper)
+                metadata[arxiv_id] = paper
+            if fetched:
+                cache.save()
+
+    citations = {arxiv_id: format_citation(arxiv_id, metadata[arxiv_id]) for arxiv_id in arxiv_ids if arxiv_id in metadata}
+    if error:
+        raise CitationLookupError(error, citations)
+    return citations
 
 # Generate citation for a given arXiv ID
-def get_arxiv_citation(arxiv_id):
-    search = arxiv.Search(id_list=[arxiv_id])
-    paper = next(search.results())
-    
-    authors = ", ".join([author.name for author in paper.authors])
-    year = paper.published.year
-    
-    citation = f"{authors}. ({year}). {paper.title}. ArXiv.org. https://arxiv.org/abs/{arxiv_id}"
-    
-    return citation
-
-# Append citation to the output file
-def append_citation_to_output(citation):
-    with open('output.txt', 'a', encoding='utf-8') as file:
-        file.write('\n\n')  # Add two newlines to create a blank line
-        file.write(citation)
-
-# Read the pdf_to_text_temp.txt file
-with open('pdf_to_text_temp.txt', 'r', encoding='utf-8') as file:
-    content = file.read()
-
-# Extract arXiv ID from the file content
-arxiv_id = extract_arxiv_id(content)
-
-if arxiv_id:
-    # Generate citation using the extracted arXiv ID
-    citation = get_arxiv_citation(arxiv_id)
-    print("Generated citation:")
-    print(citation)
-    
-    # Append the citation to the output.txt file
-    append_citation_to_output(citation)
-    print("Citation has been added to the end of output.txt")
-else:
-    print("No valid arXiv ID found")
+def get_arxiv_citation(arxiv_id, client=None, cache=None, index=None):
+    return get_arxiv_citations([arxiv_id], client=client, cache=cache, index=index).get(arxiv_id)
+
+# Write the citations on their own and the summary followed by the citations.
+# The output file is rebuilt from the summary rather than appended to, so reruns never duplicate citations.
+def write_citations_to_output(citations):
+    with open(CITATION_FILE, 'w', encoding='utf-8') as file:
+        file.write('\n\n'.join(citations))
+    with open(SUMMARY_FILE, 'r', encoding='utf-8') as file:
+        output = file.read()
+    for citation in citations:
+        output += '\n\n' + citation  # Add two newlines to create a blank line
+    tmp_path = f"{OUTPUT_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        file.write(output)
+    os.replace(tmp_path, OUTPUT_FILE)
+
+def main():
+    # Read the pdf_to_text_temp.txt file
+    with open('pdf_to_text_temp.txt', 'r', encoding='utf-8') as file:
+        content = file.read()
+
+    # Extract arXiv IDs from the file content
+    arxiv_ids = extract_arxiv_ids(content)
+
+    if not arxiv_ids:
+        write_citations_to_output([])
+        print("No valid arXiv ID found")
+        print(f"Citations have been written to {CITATION_FILE}")
+        return
+
+    # Generate citations using the extracted arXiv IDs
+    lookup_error = None
+    with profile_stage('ReferenceGenerator.get_arxiv_citations'):
+        try:
+            citations = get_arxiv_citations(arxiv_ids)
+        except CitationLookupError as e:
+            lookup_error = e
+            citations = e.citations
+    found = []
+    for arxiv_id in arxiv_ids:
+        citation = citations.get(arxiv_id)
+        if citation is None:
+            print(f"No arXiv metadata found for {arxiv_id}")
+            continue
+        print("Generated citation:")
+        print(citation)
+        found.append(citation)
+
+    # Add the citations to the end of the output file
+    write_citations_to_output(found)
+    if found:
+        print(f"Citations have been added to the end of {OUTPUT_FILE}")
+    if lookup_error is not None:
+        # Partial citations are kept for this job, but without the success message run.py retries the
+        # stage and never stores the result in the artifact store
+        print(lookup_error, file=sys.stderr)
+        sys.exit(1)
+    print(f"Citations have been written to {CITATION_FILE}")
+
+if __name__ == "__main__":
+    main()
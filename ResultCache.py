@@ -0,0 +1,142 @@
+# ResultCache.py
+# This script lets the Slack bot recognise PDFs it has already processed.
+# Finished results (summary, citations, output text and knowledge graph image) are kept in the
+# artifact store (see ArtifactStore.py) under the hash of the PDF's bytes and of the pipeline settings,
+# so the same paper uploaded again, under any name, is answered from the store without running the
+# pipeline. Only runs in which every stage succeeded are kept. The stored graph (.kgb) is not copied:
+# the store already holds it as the GraphMaker2_png.py artifact, which GraphQuery.py indexes.
+#
+# Two layers avoid work as early as possible:
+#   1. Slack file metadata: a file already seen (same file id and size, e.g. shared again to another
+#      channel) maps straight to its content hash, so not even the download is repeated. Slack gives
+#      every upload a new file id and reports no checksum of the bytes, so a paper uploaded again is
+#      not recognised here: name and size alone could match a different paper.
+#   2. Content hash: after a download, the SHA-256 of the bytes finds results of identical uploads,
+#      including re-uploads of the same paper under any name.
+# Concurrent uploads of the same content are coalesced: the first one runs the pipeline, the others
+# wait for it and are answered from its result.
+
+import json
+import os
+import threading
+from contextlib import closing
+from dotenv import load_dotenv
+from ArtifactStore import ArtifactStore, artifact_key, hash_config
+
+load_dotenv()
+
+# Slack file id and size -> content hash of files already downloaded
+SLACK_DEDUP_INDEX = os.getenv('SLACK_DEDUP_INDEX', 'slack_dedup.json')
+# Files the Slack bot posts; a cached result holds exactly these
+RESULT_FILES = ['summary.txt', 'summaries.json', 'citations.txt', 'output.txt', 'knowledge_graph.png']
+# Files a complete run leaves in the job directory
+COMPLETE_RUN_FILES = ['output.txt', 'knowledge_graph.png', 'knowledge_graph.kgb']
+
+def metadata_key(file_info):
+    """
+    Identify a Slack file by the metadata Slack reports before download. The file id is per upload,
+    so this matches re-shares of one uploaded file, never a second upload of the same paper.
+
+    Returns:
+    str: The key, or None if the file has no size (nothing to match safely).
+    """
+    if not file_info.get('size'):
+        return None
+    return f"{file_info['id']}:{file_info['size']}"
+
+def is_complete(job_dir):
+    return all(os.path.exists(os.path.join(job_dir, name)) for name in COMPLETE_RUN_FILES)
+
+def settings_hash(env):
+    # Everything that changes a stage's result (see run.stage_config) changes the cached result too
+    from run import STAGES, stage_config
+
+    return hash_config({script: stage_config(script, env) for script in STAGES})
+
+class ResultCache:
+    """
+    Finished pipeline results by PDF content, plus coalescing of in-flight jobs.
+    """
+
+    def __init__(self, index_path=SLACK_DEDUP_INDEX):
+        self.index_path = index_path
+        self.content_hashes = {}
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, 'r', encoding='utf-8') as file:
+                    self.content_hashes = json.load(file)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable dedup index {index_path}: {e}")
+
+    def hash_for(self, file_info):
+        key = metadata_key(file_info)
+        with self._lock:
+            return self.content_hashes.get(key) if key else None
+
+    def remember(self, file_info, content_hash):
+        key = metadata_key(file_info)
+        if not key:
+            return
+        with self._lock:
+            self.content_hashes[key] = content_hash
+            # Write to a temporary file first so a crash never leaves a truncated index
+            tmp_path = f"{self.index_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(self.content_hashes, file)
+            os.replace(tmp_path, self.index_path)
+
+    def _key(self, content_hash, env):
+        return artifact_key('slack_result', content_hash, settings_hash(env))
+
+    def materialize(self, content_hash, env, job_dir):
+        """
+        Copy a finished result into job_dir.
+
+        Returns:
+        bool: True if a result for this content and these settings was found.
+        """
+        # One store connection per call: Slack handlers run on different threads
+        key = self._key(content_hash, env)
+        with closing(ArtifactStore()) as store:
+            artifact = store.acquire(key)  # Keeps the store's cleanup away while copying
+            if artifact is None:
+                return False
+            try:
+                store.materialize(artifact, job_dir, RESULT_FILES)
+            finally:
+                store.release(key)
+            return True
+
+    def put(self, content_hash, env, job_dir):
+        with closing(ArtifactStore()) as store:
+            store.put(self._key(content_hash, env), 'slack_result', [os.path.join(job_dir, name) for name in RESULT_FILES])
+
+    def claim(self, content_hash):
+        """
+        Register a job for this content unless one is already running.
+
+        Returns:
+        tuple: (True, None) if the caller should run the job and later call release(),
+               or (False, event) where event is set when the running job finishes.
+        """
+        with self._lock:
+            event = self._in_flight.get(content_hash)
+            if event is not None:
+                return False, event
+            self._in_flight[content_hash] = threading.Event()
+            return True, None
+
+    def in_flight(self):
+        """
+        Content hashes of the jobs currently running.
+        """
+        with self._lock:
+            return set(self._in_flight)
+
+    def release(self, content_hash):
+        with self._lock:
+            event = self._in_flight.pop(content_hash, None)
+        if event is not None:
+            event.set()
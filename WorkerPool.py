@@ -0,0 +1,206 @@
+# WorkerPool.py
+# This script keeps a pool of pre-forked, pre-warmed worker processes that run pipeline stages.
+# A spawner process, forked once when the pool is created, imports the heavy dependencies (PyMuPDF,
+# BeautifulSoup, groq, networkx, matplotlib, arxiv, NumPy) and forks every worker, so each worker
+# starts with them already loaded; each worker also builds its Groq client once. The spawner stays
+# single-threaded, so replacing a timed-out or crashed worker never forks the (by then multithreaded)
+# Slack bot or batch runner, which could deadlock the child on a lock held by another thread.
+# Every worker's pipe is created in the pool's process and handed to the spawner as a file descriptor.
+# A stage dispatched to a worker runs exactly as `python3 <stage>.py` would (same working directory,
+# environment and stdout), without paying interpreter start-up and import costs for every stage of
+# every paper.
+#
+# Stage modules themselves are re-executed for every task so their environment-driven settings
+# are read per job; only third-party modules and cached clients are shared between tasks.
+
+import io
+import multiprocessing
+import os
+import queue
+import runpy
+import signal
+import sys
+import threading
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from multiprocessing import reduction
+from multiprocessing.connection import Connection
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WORKER_POOL_SIZE = int(os.getenv('WORKER_POOL_SIZE', '0'))  # 0 disables the pool
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Third-party modules loaded by the spawner before forking workers
+WARM_MODULES = ['fitz', 'bs4', 'tqdm', 'groq', 'networkx', 'matplotlib.pyplot', 'arxiv', 'numpy',
+                'langchain_text_splitters']
+# Repository modules that read their settings at import time; dropped before each task
+STAGE_MODULES = ['PDFParser', 'Groq', 'ReferenceGenerator', 'GraphMaker2_png', 'DocumentModel',
+                 'Compressor', 'Profiler', 'GraphStore', 'ArxivIndex', 'Checkpoint']
+
+def warm_imports():
+    """
+    Import the heavy dependencies into the current process. Missing optional modules are skipped.
+    """
+    import matplotlib
+    matplotlib.use('Agg')  # Workers have no display
+    for name in WARM_MODULES:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+
+def _run_task(script, job_dir, env):
+    os.environ.clear()
+    os.environ.update(env)
+    os.chdir(job_dir)
+    for name in STAGE_MODULES:
+        sys.modules.pop(name, None)
+
+    output, error = io.StringIO(), io.StringIO()
+    with redirect_stdout(output), redirect_stderr(error):
+        try:
+            sys.argv = [script]
+            runpy.run_path(os.path.join(SCRIPT_DIR, script), run_name='__main__')
+        except SystemExit:
+            pass
+        except Exception:
+            traceback.print_exc()
+    return output.getvalue(), error.getvalue()
+
+def _worker_main(connection):
+    from LLMClient import get_groq_client
+
+    if os.getenv('GROQ_API_KEY'):
+        get_groq_client(os.getenv('GROQ_API_KEY'))
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            break  # The pool's process is gone
+        if task is None:
+            break
+        connection.send(_run_task(*task))
+
+def _spawner_main(control):
+    warm_imports()
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)  # Exited workers are reaped automatically
+    while True:
+        try:
+            request = control.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        fd = reduction.recv_handle(control)
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            control.close()
+            code = 0
+            try:
+                _worker_main(Connection(fd))
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            os._exit(code)  # Never return into the spawner's loop
+        os.close(fd)
+        control.send(pid)
+
+class WorkerPool:
+    """
+    Fixed-size pool of forked stage workers.
+
+    Usage:
+    pool = WorkerPool(4)
+    output, error = pool.run('Groq.py', job_dir, env, timeout=25)
+    """
+
+    def __init__(self, size=WORKER_POOL_SIZE):
+        if sys.path[0] != SCRIPT_DIR:
+            sys.path.insert(0, SCRIPT_DIR)
+        # Forked once, while the caller is still single-threaded (before Slack or batch threads start)
+        context = multiprocessing.get_context('fork')
+        self._control, spawner_end = context.Pipe()
+        self._spawner = context.Process(target=_spawner_main, args=(spawner_end,), daemon=True)
+        self._spawner.start()
+        spawner_end.close()
+        self._spawn_lock = threading.Lock()
+        self._idle = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        for _ in range(max(1, size)):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        parent_end, child_end = multiprocessing.Pipe()
+        with self._spawn_lock:
+            self._control.send('spawn')
+            reduction.send_handle(self._control, child_end.fileno(), self._spawner.pid)
+            pid = self._control.recv()
+        child_end.close()
+        worker = (pid, parent_end)
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _discard(self, worker):
+        pid, connection = worker
+        try:
+            os.kill(pid, signal.SIGKILL)  # The spawner reaps it
+        except ProcessLookupError:
+            pass
+        connection.close()
+        with self._lock:
+            self._workers.remove(worker)
+
+    def run(self, script, job_dir, env, timeout=None):
+        """
+        Run a stage script in an idle worker, waiting for one if all are busy.
+
+        Args:
+        script (str): Stage script name, e.g. 'Groq.py'.
+        job_dir (str): Working directory for the stage.
+        env (dict): Complete environment for the stage.
+        timeout (float, optional): Seconds before the worker is killed and replaced.
+
+        Returns:
+        tuple: (stdout, stderr) of the stage.
+
+        Raises:
+        TimeoutError: If the stage did not finish within timeout.
+        """
+        worker = self._idle.get()
+        _, connection = worker
+        try:
+            connection.send((script, job_dir, dict(env)))
+            if not connection.poll(timeout):
+                raise TimeoutError(f"{script} did not finish within {timeout} seconds")
+            result = connection.recv()
+        except BaseException:
+            # The worker may be stuck mid-task; replace it rather than reuse it
+            self._discard(worker)
+            self._idle.put(self._spawn())
+            raise
+        self._idle.put(worker)
+        return result
+
+    def close(self):
+        with self._lock:
+            workers = list(self._workers)
+        for _, connection in workers:
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+            connection.close()
+        with self._spawn_lock:
+            try:
+                self._control.send(None)
+            except OSError:
+                pass
+            self._control.close()
+        self._spawner.join(timeout=5)
+        if self._spawner.is_alive():
+            self._spawner.terminate()
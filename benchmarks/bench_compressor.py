@@ -0,0 +1,57 @@
+# bench_compressor.py
+# Measure output size and run time of the extractive pre-compression stage (Compressor.py)
+# for several target ratios, so PRECOMPRESS_RATIO can be tuned per deployment.
+#
+# Usage:
+# python benchmarks/bench_compressor.py [text file]
+# Without a file, synthetic papers of growing length are generated.
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Compressor import compress_text, estimate_tokens
+
+RATIOS = [0.7, 0.5, 0.3, 0.2]
+SYNTHETIC_SENTENCES = [200, 1000, 3000]
+TOPICS = ["transformer", "attention", "curriculum", "fine-tuning", "benchmark", "retrieval", "graph", "embedding",
+          "latency", "accuracy", "dataset", "tokenizer", "decoder", "pretraining", "evaluation", "ablation"]
+VERBS = ["improves", "reduces", "outperforms", "extends", "combines", "analyses", "requires", "enables"]
+
+
+def synthetic_paper(num_sentences, seed=0):
+    rng = random.Random(seed)
+    sentences = []
+    for _ in range(num_sentences):
+        words = rng.sample(TOPICS, 4)
+        sentences.append(f"The {words[0]} {rng.choice(VERBS)} {words[1]} and {words[2]} "
+                         f"on the {words[3]} task by {rng.randint(1, 40)} points.")
+    return "\n".join(sentences)
+
+
+def bench(name, text):
+    input_tokens = estimate_tokens(text)
+    for ratio in RATIOS:
+        start = time.perf_counter()
+        compressed = compress_text(text, ratio)
+        elapsed = time.perf_counter() - start
+        output_tokens = estimate_tokens(compressed)
+        print(f"{name:>14} {input_tokens:>10} {ratio:>6.2f} {output_tokens:>10} "
+              f"{output_tokens / input_tokens:>8.2f} {elapsed * 1000:>10.1f}")
+
+
+def main():
+    print(f"{'input':>14} {'tokens in':>10} {'ratio':>6} {'tokens out':>10} {'actual':>8} {'time ms':>10}")
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'r', encoding='utf-8') as file:
+            bench(os.path.basename(sys.argv[1])[:14], file.read())
+        return
+    for num_sentences in SYNTHETIC_SENTENCES:
+        bench(f"{num_sentences} sentences", synthetic_paper(num_sentences))
+
+
+if __name__ == "__main__":
+    main()
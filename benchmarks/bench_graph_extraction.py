@@ -0,0 +1,84 @@
+# bench_graph_extraction.py
+# Compare one-shot and chunked (concurrent) knowledge graph extraction in GraphMaker2_png.py.
+# A simulated LLM client stands in for Groq: its latency grows with prompt length and it
+# returns entities drawn from the text it was given, so no network access or API key is needed.
+#
+# Usage:
+# python benchmarks/bench_graph_extraction.py [workers]
+
+import json
+import os
+import random
+import re
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from GraphMaker2_png import GRAPH_MAX_WORKERS, analyze_paper, analyze_paper_chunked
+
+# Simulated service: fixed request overhead plus prompt processing and generation time
+REQUEST_OVERHEAD = 0.15  # Seconds
+PROMPT_CHARS_PER_SECOND = 20000  # Roughly 5k prompt tokens per second
+GENERATION_SECONDS = 0.4
+PAPER_CHARACTERS = [20000, 60000, 150000]
+CONCEPTS = [f"Concept {i}" for i in range(60)]
+
+
+class SimulatedClient:
+    """
+    Mimics client.chat.completions.create from the Groq SDK.
+    """
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **kwargs):
+        prompt = messages[-1]['content']
+        time.sleep(REQUEST_OVERHEAD + len(prompt) / PROMPT_CHARS_PER_SECOND + GENERATION_SECONDS)
+        found = list(dict.fromkeys(re.findall(r'Concept \d+', prompt)))[:10]
+        entities = [{'id': i, 'label': label, 'importance': 1 + i % 5} for i, label in enumerate(found)]
+        relations = [{'source': i, 'target': i + 1, 'label': 'relates to'} for i in range(len(found) - 1)]
+        content = json.dumps({'entities': entities, 'relations': relations})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def synthetic_paper(characters, seed=0):
+    rng = random.Random(seed)
+    sentences = []
+    length = 0
+    while length < characters:
+        sentence = f"{rng.choice(CONCEPTS)} improves {rng.choice(CONCEPTS)} on the benchmark by a wide margin."
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(sentences)
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else GRAPH_MAX_WORKERS
+    client = SimulatedClient()
+    print(f"{'chars':>8} {'mode':>8} {'seconds':>8} {'entities':>9} {'relations':>10}")
+    # Silence the raw response logging of analyze_paper while timing
+    stdout = sys.stdout
+    for characters in PAPER_CHARACTERS:
+        content = synthetic_paper(characters)
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            single, single_time = timed(analyze_paper, content, client=client)
+            chunked, chunked_time = timed(analyze_paper_chunked, content, client=client, max_workers=workers)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        for mode, result, elapsed in (('single', single, single_time), ('chunked', chunked, chunked_time)):
+            print(f"{characters:>8} {mode:>8} {elapsed:>8.2f} {len(result['entities']):>9} {len(result['relations']):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# bench_graph_query.py
+# Measure GraphQuery.py latency on synthetic graphs with millions of edges.
+# Reports the time to open and index a stored graph, the one-off cost of each lazily built index,
+# and p50/p95/p99 latency of every query type uncached (GraphIndex directly), cached (GraphService)
+# and from the cache over HTTP.
+#
+# Usage:
+# python benchmarks/bench_graph_query.py [--nodes 500000] [--edges 2000000] [--queries 200]
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from urllib.parse import quote
+from urllib.request import urlopen
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from GraphQuery import GraphService, make_handler
+from GraphStore import ARRAY_DTYPES, StringTable, save_arrays
+from bench_graph_store import LABEL_VOCABULARY
+
+TERMS = ["attention", "transformer", "retrieval", "diffusion", "graph", "benchmark", "alignment", "token",
+         "sparse", "contrastive", "reinforcement", "distillation", "encoder", "decoder", "latent", "prompt"]
+KINDS = ["method", "dataset", "result", "metric", "model", "task"]
+
+
+def make_arrays(num_nodes, num_edges, seed=0):
+    """
+    Build the stored-graph arrays directly, without networkx, for a graph with skewed degrees.
+
+    Returns:
+    tuple: (arrays dict for save_arrays, list of node labels)
+    """
+    rng = np.random.default_rng(seed)
+    strings = StringTable()
+    terms = rng.integers(0, len(TERMS), size=(num_nodes, 2))
+    kinds = rng.integers(0, len(KINDS), size=num_nodes)
+    labels = [f"{TERMS[a]} {TERMS[b]} {KINDS[kind]} {i}" for i, ((a, b), kind) in enumerate(zip(terms.tolist(), kinds.tolist()))]
+    node_id = [strings.intern(i) for i in range(num_nodes)]
+    node_label = [strings.intern(label) for label in labels]
+    edge_label_ids = [strings.intern(label) for label in LABEL_VOCABULARY]
+    # Pareto-distributed targets give a few hub entities, as merged multi-paper graphs have
+    targets = np.minimum(rng.pareto(1.2, num_edges) * num_nodes / 50, num_nodes - 1).astype(np.int64)
+    targets = rng.permutation(num_nodes)[targets]
+    string_offsets, string_data = strings.to_arrays()
+    arrays = {
+        'string_offsets': string_offsets,
+        'string_data': string_data,
+        'node_id': np.asarray(node_id, dtype=ARRAY_DTYPES['node_id']),
+        'node_label': np.asarray(node_label, dtype=ARRAY_DTYPES['node_label']),
+        'node_importance': rng.integers(1, 6, size=num_nodes).astype(ARRAY_DTYPES['node_importance']),
+        'edge_source': rng.integers(0, num_nodes, size=num_edges).astype(ARRAY_DTYPES['edge_source']),
+        'edge_target': targets.astype(ARRAY_DTYPES['edge_target']),
+        'edge_label': np.asarray(edge_label_ids, dtype=ARRAY_DTYPES['edge_label'])[rng.integers(0, len(edge_label_ids), size=num_edges)],
+    }
+    return arrays, labels
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def percentiles(samples):
+    p50, p95, p99 = np.percentile(np.asarray(samples) * 1000, [50, 95, 99])
+    return f"{p50:>9.2f} {p95:>9.2f} {p99:>9.2f}"
+
+
+def query_params(labels, count, seed=1):
+    """
+    Random parameters for every query type, referring to existing entities.
+    """
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(labels), size=(count, 2)).tolist()
+    typo = lambda label: label[:3] + label[4:]  # Drop one character
+    return {
+        'neighbors': [{'node': labels[a], 'hops': '2', 'limit': '50'} for a, _ in picks],
+        'paths': [{'source': labels[a], 'target': labels[b], 'k': '3', 'limit': '5'} for a, b in picks],
+        'search prefix': [{'q': ' '.join(labels[a].split()[:2]), 'limit': '20'} for a, _ in picks],
+        'search fuzzy': [{'q': typo(labels[a]), 'mode': 'fuzzy', 'limit': '20'} for a, _ in picks],
+        'top': [{'limit': str(10 + a % 90)} for a, _ in picks],
+    }
+
+
+def run_uncached(index, name, params):
+    if name == 'neighbors':
+        return index.neighbors(params['node'], int(params['hops']), 'both', int(params['limit']))
+    if name == 'paths':
+        return index.paths(params['source'], params['target'], int(params['k']), 'both', int(params['limit']))
+    if name == 'search prefix':
+        return index.search_prefix(params['q'], int(params['limit']))
+    if name == 'search fuzzy':
+        return index.search_fuzzy(params['q'], int(params['limit']))
+    return index.top(int(params['limit']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the knowledge graph query service")
+    parser.add_argument('--nodes', type=int, default=500000)
+    parser.add_argument('--edges', type=int, default=2000000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'graph.kgb')
+        (arrays, labels), build_time = timed(make_arrays, args.nodes, args.edges)
+        _, save_time = timed(save_arrays, arrays, path)
+        del arrays
+        service, load_time = timed(GraphService, [path])
+        index = service.graphs['graph']
+        print(f"Graph: {args.nodes} nodes, {args.edges} edges, {os.path.getsize(path) / 1024 / 1024:.1f} MB "
+              f"(generated in {build_time:.1f}s, saved in {save_time:.1f}s)")
+        print(f"Open and build adjacency: {load_time * 1000:.0f} ms")
+        for name, build in (('label index', index._label_index), ('trigram index', index._trigram_index),
+                            ('importance ranking', index._importance_ranking)):
+            _, elapsed = timed(build)
+            print(f"Build {name} on first use: {elapsed * 1000:.0f} ms")
+
+        workload = query_params(labels, args.queries)
+        server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(service))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        print(f"\n{'query':>14} {'mode':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for name, params_list in workload.items():
+            endpoint = name.split()[0]
+            uncached = [timed(run_uncached, index, name, params)[1] for params in params_list]
+            for params in params_list:
+                service.query(endpoint, params)  # Warm the cache
+            cached = [timed(service.query, endpoint, params)[1] for params in params_list]
+            over_http = []
+            for params in params_list:
+                url = f"{base_url}/{endpoint}?" + '&'.join(f"{key}={quote(value)}" for key, value in params.items())
+                start = time.perf_counter()
+                with urlopen(url) as response:
+                    json.load(response)
+                over_http.append(time.perf_counter() - start)
+            print(f"{name:>14} {'uncached':>9} {percentiles(uncached)}")
+            print(f"{'':>14} {'cached':>9} {percentiles(cached)}")
+            print(f"{'':>14} {'http':>9} {percentiles(over_http)}")
+        print(f"\nCache: {service.cache.stats()}")
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
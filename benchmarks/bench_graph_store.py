@@ -0,0 +1,103 @@
+# bench_graph_store.py
+# Compare the compact .kgb graph store against GraphML and node-link JSON.
+# Measures file size, save time, full round-trip time (load + rebuild networkx graph)
+# and open time (header + arrays only, no networkx rebuild).
+#
+# Usage:
+# python benchmarks/bench_graph_store.py [node counts...]
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import networkx as nx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from GraphStore import load_graph, save_graph
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+EDGES_PER_NODE = 4
+LABEL_VOCABULARY = ["uses", "improves", "evaluates", "extends", "solves", "achieves", "implements", "compares"]
+
+
+def make_graph(num_nodes, seed=0):
+    """
+    Build a random graph shaped like create_knowledge_graph output.
+
+    Args:
+    num_nodes (int): Number of entities.
+    seed (int): Random seed.
+
+    Returns:
+    networkx.Graph: The synthetic graph.
+    """
+    rng = random.Random(seed)
+    G = nx.Graph()
+    for i in range(num_nodes):
+        G.add_node(i, label=f"Concept {i} of the paper", importance=rng.randint(1, 5))
+    for _ in range(num_nodes * EDGES_PER_NODE):
+        G.add_edge(rng.randrange(num_nodes), rng.randrange(num_nodes), label=rng.choice(LABEL_VOCABULARY))
+    return G
+
+
+def save_json(G, path):
+    with open(path, 'w', encoding='utf-8') as fp:
+        json.dump(nx.node_link_data(G), fp)
+
+
+def load_json(path):
+    with open(path, 'r', encoding='utf-8') as fp:
+        return nx.node_link_graph(json.load(fp))
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_format(name, save, load, open_only, G, directory):
+    path = os.path.join(directory, f"graph.{name}")
+    _, save_time = timed(save, G, path)
+    H, load_time = timed(load, path)
+    assert H.number_of_nodes() == G.number_of_nodes() and H.number_of_edges() == G.number_of_edges()
+    _, open_time = timed(open_only, path)
+    return {
+        'format': name,
+        'size_kb': os.path.getsize(path) / 1024,
+        'save_ms': save_time * 1000,
+        'load_ms': load_time * 1000,
+        'open_ms': open_time * 1000,
+    }
+
+
+def touch_arrays(path):
+    # Open the store and read the edge arrays, which is what analytics passes need
+    graph = load_graph(path)
+    return int(graph.edge_source.sum()) + int(graph.edge_target.sum())
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    formats = [
+        ('kgb', save_graph, lambda path: load_graph(path).to_networkx(), touch_arrays),
+        ('json', save_json, load_json, load_json),
+        ('graphml', nx.write_graphml, nx.read_graphml, nx.read_graphml),
+    ]
+
+    print(f"{'nodes':>8} {'edges':>8} {'format':>8} {'size KB':>10} {'save ms':>10} {'load ms':>10} {'open ms':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            G = make_graph(size)
+            for name, save, load, open_only in formats:
+                result = bench_format(name, save, load, open_only, G, directory)
+                print(f"{size:>8} {G.number_of_edges():>8} {result['format']:>8} {result['size_kb']:>10.1f} "
+                      f"{result['save_ms']:>10.1f} {result['load_ms']:>10.1f} {result['open_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+# run_benchmarks.py
+# Benchmark every pipeline stage on synthetic inputs, compare against stored baselines and flag regressions.
+# Everything is generated locally (PDFs with PyMuPDF, LLM responses, graphs), so it runs offline.
+#
+# Stages:
+#   pdf2html, html2txt, pdf2sections   PDFParser.py on synthetic PDFs of growing page counts
+#   pdf2html_lazy                      PDFParser.py lazy mode with the default token budget
+#   compress_text                      Compressor.py on the extracted text
+#   extract_json_from_text             GraphMaker2_png.py on synthetic LLM responses
+#   create_knowledge_graph             GraphMaker2_png.py on entity/relation lists of growing size
+#   visualize_graph                    GraphMaker2_png.py matplotlib rendering
+#   save_graph, load_graph             GraphStore.py
+#
+# For each stage and input size it reports latency percentiles (p50/p95/p99), throughput
+# and peak traced memory (tracemalloc, measured in a separate run so it does not skew timings).
+#
+# Usage:
+# python benchmarks/run_benchmarks.py                     compare with benchmarks/baselines.json
+# python benchmarks/run_benchmarks.py --save-baseline     record the current results as the baseline
+# python benchmarks/run_benchmarks.py --pages 5,50 --graph-sizes 10,1000 --repeat 10 --stage pdf2html
+
+import argparse
+import functools
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault('TQDM_DISABLE', '1')  # PDFParser progress bars would flood the report
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, '..'))
+
+import fitz
+
+import PDFParser
+from Compressor import compress_text
+from GraphMaker2_png import create_knowledge_graph, extract_json_from_text, visualize_graph
+from GraphStore import load_graph, save_graph
+from bench_compressor import synthetic_paper
+from bench_graph_store import LABEL_VOCABULARY
+
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baselines.json')
+DEFAULT_PAGES = [5, 20, 50]
+DEFAULT_GRAPH_SIZES = [10, 100, 1000]
+DEFAULT_RENDER_SIZES = [10, 50]  # matplotlib rendering is only realistic for small graphs
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.25  # Relative slowdown or memory growth that counts as a regression
+MIN_REGRESSION_SECONDS = 0.002  # Ignore differences that are within timer noise
+
+
+def synthetic_pdf(path, pages, seed=0):
+    """
+    Write a paper-like PDF: title, abstract, numbered sections with body text, captions and references.
+    """
+    rng = random.Random(seed)
+    sentences = synthetic_paper(pages * 40, seed).split("\n")
+    doc = fitz.open()
+    section = 1
+    for page_number in range(pages):
+        page = doc.new_page()
+        y = 60
+        if page_number == 0:
+            page.insert_text((72, y), "A Synthetic Study of Benchmark Corpora", fontsize=18, fontname="hebo")
+            page.insert_text((72, y + 30), "arXiv:2401.00001v1 [cs.CL] 1 Jan 2024", fontsize=8)
+            page.insert_text((72, y + 55), "Abstract", fontsize=11, fontname="hebo")
+            y += 75
+        if page_number == pages - 1:
+            page.insert_text((72, y), "References", fontsize=12, fontname="hebo")
+            for i in range(20):
+                page.insert_text((72, y + 20 + i * 14), f"[{i + 1}] A. Author. Reference title {i}. 2023.", fontsize=9)
+            continue
+        if page_number % 2 == 0:
+            page.insert_text((72, y), f"{section} Section {section}", fontsize=12, fontname="hebo")
+            section += 1
+            y += 20
+        text = " ".join(sentences[page_number * 40:(page_number + 1) * 40])
+        page.insert_textbox(fitz.Rect(72, y, 540, 700), text, fontsize=10)
+        page.insert_text((72, 740), f"Figure {page_number + 1}: Synthetic caption {rng.randint(0, 99)}.", fontsize=9)
+    doc.save(path)
+
+
+def synthetic_analysis(num_entities, seed=0):
+    rng = random.Random(seed)
+    entities = [{'id': i, 'label': f"Concept {i}", 'importance': rng.randint(1, 5)} for i in range(num_entities)]
+    relations = [{'source': rng.randrange(num_entities), 'target': rng.randrange(num_entities),
+                  'label': rng.choice(LABEL_VOCABULARY)} for _ in range(num_entities * 2)]
+    return {'entities': entities, 'relations': relations}
+
+
+def synthetic_responses(num_entities):
+    """
+    LLM responses in the shapes extract_json_from_text has to handle.
+    """
+    payload = json.dumps(synthetic_analysis(num_entities), indent=2)
+    return [
+        payload,
+        f"```json\n{payload}\n```",
+        f"Here is the knowledge graph you asked for:\n{payload}\nLet me know if you need anything else.",
+    ]
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def measure(func, repeat):
+    """
+    Time func over several runs and record its peak traced memory in one extra run.
+
+    Returns:
+    dict: p50/p95/p99/mean seconds and peak_kb.
+    """
+    func()  # Warm-up: imports, caches, font loading
+    samples = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'p50': percentile(samples, 50),
+        'p95': percentile(samples, 95),
+        'p99': percentile(samples, 99),
+        'mean': sum(samples) / len(samples),
+        'peak_kb': peak / 1024,
+    }
+
+
+def pdf_cases(pages_list, workdir):
+    for pages in pages_list:
+        pdf_path = os.path.join(workdir, f"synthetic_{pages}.pdf")
+        html_path = os.path.join(workdir, f"synthetic_{pages}.html")
+        txt_path = os.path.join(workdir, f"synthetic_{pages}.txt")
+        synthetic_pdf(pdf_path, pages)
+        PDFParser.pdf2html(pdf_path, html_path)
+        PDFParser.html2txt(html_path, txt_path)
+        with open(txt_path, 'r', encoding='utf-8') as file:
+            text = file.read()
+
+        # Bind arguments with partial: the cases are collected before any of them runs
+        yield 'pdf2html', f"{pages}p", pages, 'pages', functools.partial(PDFParser.pdf2html, pdf_path, html_path)
+        yield ('pdf2html_lazy', f"{pages}p", pages, 'pages',
+               functools.partial(PDFParser.pdf2html_lazy, pdf_path, os.path.join(workdir, f"synthetic_{pages}_lazy.html")))
+        yield 'html2txt', f"{pages}p", pages, 'pages', functools.partial(PDFParser.html2txt, html_path, txt_path)
+        yield 'pdf2sections', f"{pages}p", pages, 'pages', functools.partial(PDFParser.pdf2sections, pdf_path)
+        yield 'compress_text', f"{pages}p", len(text), 'chars', functools.partial(compress_text, text, 0.3)
+
+
+def graph_cases(graph_sizes, render_sizes, workdir):
+    for size in graph_sizes:
+        responses = synthetic_responses(size)
+        analysis = synthetic_analysis(size)
+        G = create_knowledge_graph(analysis['entities'], analysis['relations'])
+        store_path = os.path.join(workdir, f"graph_{size}.kgb")
+        save_graph(G, store_path)
+
+        yield 'extract_json_from_text', f"{size}n", len(responses), 'responses', functools.partial(parse_all, responses)
+        yield ('create_knowledge_graph', f"{size}n", size, 'entities',
+               functools.partial(create_knowledge_graph, analysis['entities'], analysis['relations']))
+        yield 'save_graph', f"{size}n", size, 'entities', functools.partial(save_graph, G, store_path)
+        yield 'load_graph', f"{size}n", size, 'entities', functools.partial(reload_graph, store_path)
+
+    for size in render_sizes:
+        analysis = synthetic_analysis(size)
+        G = create_knowledge_graph(analysis['entities'], analysis['relations'])
+        yield 'visualize_graph', f"{size}n", size, 'entities', functools.partial(render, G)
+
+
+def parse_all(responses):
+    return [extract_json_from_text(response) for response in responses]
+
+
+def reload_graph(path):
+    return load_graph(path).to_networkx()
+
+
+def render(G):
+    import matplotlib.pyplot as plt
+
+    visualize_graph(G)
+    plt.close('all')
+
+
+def run(args):
+    results = {}
+    stdout = sys.stdout
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)  # visualize_graph writes knowledge_graph.png to the working directory
+        try:
+            cases = list(pdf_cases(args.pages, workdir)) + list(graph_cases(args.graph_sizes, args.render_sizes, workdir))
+            for stage, size, units, unit_name, func in cases:
+                if args.stage and stage not in args.stage:
+                    continue
+                sys.stdout = open(os.devnull, 'w')  # Stages print progress messages
+                try:
+                    result = measure(func, args.repeat)
+                finally:
+                    sys.stdout.close()
+                    sys.stdout = stdout
+                result['throughput'] = units / result['p50'] if result['p50'] > 0 else float('inf')
+                result['unit'] = unit_name
+                results[f"{stage}[{size}]"] = result
+                print(f"{stage + '[' + size + ']':<32} {result['p50'] * 1000:>9.2f} {result['p95'] * 1000:>9.2f} "
+                      f"{result['p99'] * 1000:>9.2f} {result['throughput']:>12.1f} {unit_name + '/s':<12} "
+                      f"{result['peak_kb']:>10.0f}")
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Return a description of every benchmark that got slower or used more memory than its baseline.
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if result['p50'] > previous['p50'] * (1 + threshold) and result['p50'] - previous['p50'] > MIN_REGRESSION_SECONDS:
+            regressions.append(f"{name}: p50 {previous['p50'] * 1000:.2f} ms -> {result['p50'] * 1000:.2f} ms")
+        if result['peak_kb'] > previous['peak_kb'] * (1 + threshold) and result['peak_kb'] - previous['peak_kb'] > 64:
+            regressions.append(f"{name}: peak memory {previous['peak_kb']:.0f} KB -> {result['peak_kb']:.0f} KB")
+    return regressions
+
+
+def parse_sizes(value):
+    return [int(size) for size in value.split(',') if size.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic inputs.")
+    parser.add_argument('--pages', type=parse_sizes, default=DEFAULT_PAGES, help="Comma-separated PDF page counts")
+    parser.add_argument('--graph-sizes', type=parse_sizes, default=DEFAULT_GRAPH_SIZES, help="Comma-separated entity counts")
+    parser.add_argument('--render-sizes', type=parse_sizes, default=DEFAULT_RENDER_SIZES, help="Entity counts for visualize_graph")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="Timed runs per benchmark")
+    parser.add_argument('--stage', action='append', help="Only run this stage (repeatable)")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="Baseline file")
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    print(f"{'benchmark':<32} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'throughput':>12} {'':<12} {'peak KB':>10}")
+    results = run(args)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r', encoding='utf-8') as file:
+                baseline = json.load(file).get('results', {})
+        baseline.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump({'machine': platform.platform(), 'python': platform.python_version(), 'results': baseline},
+                      file, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return
+    with open(args.baseline, 'r', encoding='utf-8') as file:
+        baseline = json.load(file).get('results', {})
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
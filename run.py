@@ -1,58 +1,283 @@
 # 该程序为工作流的主程序，用于依次运行各个脚本
 
+import hashlib
 import subprocess
 import time
 import sys
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from ArtifactStore import ArtifactStore, artifact_key, hash_config, hash_files
+from ArxivIndex import index_version
 
-def run_script(script_name):
+load_dotenv()
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Directory holding this job's intermediate and output files; stages run with it as working directory.
+# In batch mode (python run.py a.pdf b.pdf ...) each PDF gets a subdirectory named after it.
+JOB_DIR = os.path.abspath(os.getenv('JOB_DIR', '.'))
+INPUT_PDF_PATH = os.path.abspath(os.getenv('INPUT_PDF_PATH', 'input.pdf'))
+
+# Stage timeout budget: a base plus an allowance for the size of the stage's input, growing with
+# every retry. Stages checkpoint completed sub-steps, so a retry continues where the timeout hit.
+STAGE_TIMEOUT = float(os.getenv('STAGE_TIMEOUT', '25'))  # Seconds
+STAGE_TIMEOUT_PER_MB = float(os.getenv('STAGE_TIMEOUT_PER_MB', '10'))  # Per MB of PDF, for PDFParser.py
+STAGE_TIMEOUT_PER_1K_TOKENS = float(os.getenv('STAGE_TIMEOUT_PER_1K_TOKENS', '1.5'))  # Per 1k tokens of paper text, for LLM stages
+STAGE_TIMEOUT_BACKOFF = float(os.getenv('STAGE_TIMEOUT_BACKOFF', '1.5'))  # Budget multiplier per retry
+STAGE_TIMEOUT_MAX = float(os.getenv('STAGE_TIMEOUT_MAX', '600'))
+CHARS_PER_TOKEN = 4
+STAGE_MAX_ATTEMPTS = int(os.getenv('STAGE_MAX_ATTEMPTS', '3'))  # Each attempt resumes from the previous one's checkpoint
+
+# Stages the pipeline continues without when they fail: their results are left out, not cached
+OPTIONAL_STAGES = ('ReferenceGenerator.py', 'GraphMaker2_png.py')
+
+# Settings naming files shared by every job, with their defaults. Stages run inside the job directory,
+# so relative paths are resolved against the directory run.py was started from before any stage runs.
+SHARED_PATHS = {'ARXIV_CACHE_PATH': 'arxiv_cache.json', 'ARXIV_INDEX_PATH': 'arxiv_index.sqlite'}
+
+# Logged at the end of a run in which every stage succeeded; runs without it produced partial results
+PIPELINE_COMPLETE_MESSAGE = "Pipeline complete: every stage succeeded"
+
+# Each stage's input files, output files, the settings that affect its result and the repository
+# modules it imports whose code affects its result. Paths are relative to JOB_DIR; None stands for the input PDF.
+STAGES = {
+    'PDFParser.py': {
+        'inputs': [None],
+        'outputs': ['pdf_to_text_temp.txt', 'pdf_to_sections_temp.json'],
+        'config': ['PDF_PARSE_MODE', 'PDF_TOKEN_BUDGET'],
+        'modules': ['Compressor.py', 'DocumentModel.py'],
+    },
+    'Groq.py': {
+        'inputs': ['pdf_to_text_temp.txt', 'pdf_to_sections_temp.json'],
+        'outputs': ['summary.txt', 'summaries.json', 'output.txt'],
+        'config': ['GROQ_MODEL', 'PROMPT_TEMPLATE', 'DEFAULT_SUMMARY_LANGUAGE', 'SUMMARY_LANGUAGES',
+                   'TRANSLATION_PROMPT_TEMPLATE', 'DEFAULT_TEMPERATURE', 'DEFAULT_MAX_TOKENS',
+                   'SUMMARY_SECTIONS', 'PRECOMPRESS_RATIO'],
+        'modules': ['Compressor.py', 'DocumentModel.py', 'LLMClient.py'],
+    },
+    'ReferenceGenerator.py': {
+        'inputs': ['pdf_to_text_temp.txt', 'summary.txt'],
+        'outputs': ['citations.txt', 'output.txt'],
+        'config': ['ARXIV_OFFLINE'],
+        'modules': ['ArxivIndex.py'],
+    },
+    'GraphMaker2_png.py': {
+        'inputs': ['pdf_to_text_temp.txt', 'pdf_to_sections_temp.json'],
+        'outputs': ['knowledge_graph.png', 'knowledge_graph.kgb'],
+        'config': ['GROQ_MODEL', 'GRAPH_SECTIONS', 'PRECOMPRESS_RATIO', 'GRAPH_EXTRACTION_MODE',
+                   'GRAPH_CHUNK_SIZE', 'GRAPH_CHUNK_OVERLAP', 'GRAPH_TOP_K'],
+        'modules': ['Compressor.py', 'DocumentModel.py', 'LLMClient.py', 'GraphStore.py'],
+    },
+}
+
+def stage_environment(job_dir, input_pdf_path, env=None):
+    """
+    Environment for the stages of one job: the job's paths, with shared files resolved to absolute paths.
+    """
+    env = dict(env or os.environ, JOB_DIR=job_dir, INPUT_PDF_PATH=input_pdf_path)
+    for name, default in SHARED_PATHS.items():
+        env[name] = os.path.abspath(env.get(name) or default)
+    return env
+
+def use_artifact_store(env):
+    """
+    Whether a job serves unchanged stages from the artifact store: ARTIFACT_CACHE (True/False) in its
+    environment, except for profiled jobs, whose stages must actually run to be measured.
+    """
+    profiled = env.get('PROFILE', 'False').lower() in ('true', '1')
+    return env.get('ARTIFACT_CACHE', 'True').lower() == 'true' and not profiled
+
+def stage_config(script_name, env):
+    """
+    Everything besides its input files that a stage's result depends on: its settings, the source code of
+    the stage and the modules it uses and, for citations, the state of the offline arXiv index.
+    """
+    spec = STAGES[script_name]
+    config = {name: env.get(name) for name in spec['config']}
+    config['code'] = hash_files([os.path.join(SCRIPT_DIR, name) for name in [script_name] + spec['modules']])
+    if script_name == 'ReferenceGenerator.py':
+        # Ids missing from the index are left out offline; a rebuilt index must not serve those citations
+        config['arxiv_index'] = index_version(env.get('ARXIV_INDEX_PATH') or SHARED_PATHS['ARXIV_INDEX_PATH'])
+    return config
+
+def stage_key(script_name, job_dir, input_pdf_path, env):
+    """
+    Artifact key of a stage: its input file contents and its stage_config.
+    """
+    spec = STAGES[script_name]
+    inputs = [input_pdf_path if name is None else os.path.join(job_dir, name) for name in spec['inputs']]
+    return artifact_key(script_name, hash_files(inputs), hash_config(stage_config(script_name, env)))
+
+def stage_timeout(script_name, job_dir, input_pdf_path, attempt=0):
+    """
+    Seconds a stage may run: STAGE_TIMEOUT plus a share proportional to its input size, scaled by
+    STAGE_TIMEOUT_BACKOFF for each earlier attempt and capped at STAGE_TIMEOUT_MAX.
+    """
+    budget = STAGE_TIMEOUT
+    if script_name == 'PDFParser.py' and os.path.exists(input_pdf_path):
+        budget += STAGE_TIMEOUT_PER_MB * os.path.getsize(input_pdf_path) / (1024 * 1024)
+    elif script_name in ('Groq.py', 'GraphMaker2_png.py'):
+        text_path = os.path.join(job_dir, 'pdf_to_text_temp.txt')
+        if os.path.exists(text_path):
+            budget += STAGE_TIMEOUT_PER_1K_TOKENS * os.path.getsize(text_path) / CHARS_PER_TOKEN / 1000
+    return min(budget * STAGE_TIMEOUT_BACKOFF ** attempt, STAGE_TIMEOUT_MAX)
+
+def check_success(script_name, output):
+    if script_name == 'PDFParser.py':
+        return 'PDF content has been extracted to pdf_to_text_temp.txt' in output
+    if script_name == 'Groq.py':
+        return 'Summary generated and saved to' in output
+    if script_name == 'ReferenceGenerator.py':
+        return 'Citations have been written to' in output
+    if script_name == 'GraphMaker2_png.py':
+        return 'Knowledge graph has been generated and saved as' in output
+    return False
+
+def run_script(script_name, job_dir=JOB_DIR, env=None, pool=None, log=print, timeout=STAGE_TIMEOUT):
+    """
+    Run one stage, in a fresh interpreter or, when a WorkerPool is given, in a pre-warmed worker.
+    """
     try:
-        process = subprocess.Popen(['python3', script_name], stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
-        success = False
-        try:
-            output, error = process.communicate(timeout=25)  # Set timeout threshold to 25 seconds
-        except subprocess.TimeoutExpired:
-            process.kill()
-            output, error = process.communicate()
-            print(f"{script_name} terminated due to timeout", file=sys.stderr)
-            return success
+        if pool:
+            try:
+                output, error = pool.run(script_name, job_dir, env or os.environ, timeout=timeout)
+            except TimeoutError:
+                log(f"{script_name} terminated due to timeout after {timeout:.0f}s; completed steps are checkpointed", file=sys.stderr)
+                return False
+        else:
+            process = subprocess.Popen(['python3', os.path.join(SCRIPT_DIR, script_name)], cwd=job_dir, env=env,
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+            try:
+                output, error = process.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                output, error = process.communicate()
+                log(f"{script_name} terminated due to timeout after {timeout:.0f}s; completed steps are checkpointed", file=sys.stderr)
+                return False
 
+        success = False
         if output:
-            print(output.strip())
-            if script_name == 'PDFParser.py' and 'PDF content has been extracted to pdf_to_text_temp.txt' in output:
-                success = True
-            elif script_name == 'Groq.py' and 'Summary generated and saved to output.txt' in output:
-                success = True
-            elif script_name == 'ReferenceGenerator.py' and len(output.strip()) > 0:  # Any output is considered success
-                success = True
-            elif script_name == 'GraphMaker2_png.py' and 'Knowledge graph has been generated and saved as' in output:
-                success = True
+            log(output.strip())
+            success = check_success(script_name, output)
         if error:
-            print(f"Error: {error.strip()}", file=sys.stderr)
+            log(f"Error: {error.strip()}", file=sys.stderr)
+        return success
     except Exception as e:
-        print(f"An exception occurred while running {script_name}: {e}", file=sys.stderr)
-    return success
+        log(f"An exception occurred while running {script_name}: {e}", file=sys.stderr)
+        return False
 
-def main():
+def run_pipeline(job_dir=JOB_DIR, input_pdf_path=INPUT_PDF_PATH, env=None, pool=None, on_stage_complete=None, log=print):
+    """
+    Run every stage for one PDF.
+
+    Args:
+    job_dir (str): Directory for the job's intermediate and output files.
+    input_pdf_path (str): The PDF to process.
+    env (dict, optional): Base environment for the stages; defaults to os.environ.
+    pool (WorkerPool, optional): Run stages in pre-warmed workers instead of fresh interpreters.
+    on_stage_complete (callable, optional): Called with the script name after each successful stage.
+    log (callable): print-compatible function for progress messages.
+
+    Returns:
+    bool: True if the pipeline reached the knowledge graph stage. PIPELINE_COMPLETE_MESSAGE is
+    logged as well when every stage succeeded.
+    """
     scripts = ['PDFParser.py', 'Groq.py', 'ReferenceGenerator.py', 'GraphMaker2_png.py']
-    
-    for i, script in enumerate(scripts):
-        print(f"Running {script}...")
-        max_retries = 3 if i < len(scripts) - 1 else 1  # Only try once for the last script
-        for attempt in range(max_retries):
-            if run_script(script):
-                print(f"{script} execution successful\n")
-                break
-            else:
-                if attempt < max_retries - 1:
-                    print(f"{script} failed to complete the expected task, retrying... (Attempt {attempt + 2}/{max_retries})")
-                    time.sleep(5)  # Increase wait time
-                elif script == 'GraphMaker2_png.py':
-                    print(f"{script} execution completed, but success message not detected. Continuing execution.\n")
+    job_dir = os.path.abspath(job_dir)
+    input_pdf_path = os.path.abspath(input_pdf_path)
+    env = stage_environment(job_dir, input_pdf_path, env)
+    os.makedirs(job_dir, exist_ok=True)
+    store = ArtifactStore() if use_artifact_store(env) else None
+    used_artifacts = []
+    complete = True
+
+    def stage_complete(script, message):
+        log(message)
+        if on_stage_complete:
+            on_stage_complete(script)
+
+    try:
+        for script in scripts:
+            log(f"Running {script}...")
+            key = stage_key(script, job_dir, input_pdf_path, env) if store else None
+            artifact = store.acquire(key) if store else None
+            if artifact:
+                used_artifacts.append(key)
+                store.materialize(artifact, job_dir, STAGES[script]['outputs'])
+                log(f"{script} inputs unchanged, outputs served from the artifact store")
+                stage_complete(script, f"{script} execution successful\n")
+                continue
+
+            max_retries = STAGE_MAX_ATTEMPTS
+            for attempt in range(max_retries):
+                timeout = stage_timeout(script, job_dir, input_pdf_path, attempt)
+                if run_script(script, job_dir, env, pool, log, timeout):
+                    if store:
+                        store.put(key, script, [os.path.join(job_dir, name) for name in STAGES[script]['outputs']])
+                        if store.acquire(key):
+                            used_artifacts.append(key)
+                    stage_complete(script, f"{script} execution successful\n")
+                    break
                 else:
-                    print(f"{script} failed to complete successfully after {max_retries} attempts. Skipping this script.\n")
-                    return  # Stop executing subsequent tasks if one task fails
+                    if attempt < max_retries - 1:
+                        log(f"{script} failed to complete the expected task, retrying... (Attempt {attempt + 2}/{max_retries})")
+                        time.sleep(5)  # Increase wait time
+                    elif script in OPTIONAL_STAGES:
+                        complete = False
+                        stage_complete(script, f"{script} execution completed, but success message not detected. Continuing execution.\n")
+                    else:
+                        log(f"{script} failed to complete successfully after {max_retries} attempts. Skipping this script.\n")
+                        return False  # Stop executing subsequent tasks if one task fails
+        if complete:
+            log(PIPELINE_COMPLETE_MESSAGE)
+        return True
+    finally:
+        if store:
+            for key in used_artifacts:
+                store.release(key)
+            store.collect()
+            store.close()
+
+def job_names(pdf_paths):
+    """
+    Job directory name for each PDF: its file name without extension, followed by a hash of its full
+    path when several PDFs share that name (a/paper.pdf, b/paper.pdf), so no two jobs share a directory.
+    """
+    names = [os.path.splitext(os.path.basename(path))[0] for path in pdf_paths]
+    counts = Counter(names)
+    return [name if counts[name] == 1 else f"{name}-{hashlib.sha256(os.path.abspath(path).encode('utf-8')).hexdigest()[:8]}"
+            for name, path in zip(names, pdf_paths)]
+
+def run_batch(pdf_paths):
+    """
+    Process several PDFs concurrently on a pre-warmed worker pool, each in its own job directory under JOB_DIR.
+    """
+    from WorkerPool import WORKER_POOL_SIZE, WorkerPool
+
+    # A PDF given twice is processed once
+    pdf_paths = list(dict.fromkeys(os.path.abspath(path) for path in pdf_paths))
+    pool = WorkerPool(WORKER_POOL_SIZE or min(len(pdf_paths), os.cpu_count() or 1))
+
+    def process(pdf_path, name):
+        def log(message, file=None):
+            print(f"[{name}] {message}", file=file, flush=True)
+
+        return run_pipeline(os.path.join(JOB_DIR, name), pdf_path, pool=pool, log=log)
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(pdf_paths)) as executor:
+            results = list(executor.map(process, pdf_paths, job_names(pdf_paths)))
+    finally:
+        pool.close()
+    for pdf_path, success in zip(pdf_paths, results):
+        print(f"{pdf_path}: {'done' if success else 'failed'}")
+
+def main():
+    if len(sys.argv) > 1:
+        run_batch(sys.argv[1:])
+    else:
+        run_pipeline()
 
 if __name__ == "__main__":
     main()
-
-# For the last script, we don't need to detect success, just wait for it to finish.
\ No newline at end of file
@@ -4,12 +4,20 @@
 
 import os
 import logging
+import shutil
+import threading
+import time
 from dotenv import load_dotenv
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
 import asyncio
 import aiofiles
 import aiohttp
+from concurrent.futures import ThreadPoolExecutor
+from ArtifactStore import hash_file
+from Checkpoint import remove_stale_checkpoints
+from ResultCache import ResultCache, is_complete
+from run import PIPELINE_COMPLETE_MESSAGE
 
 # Load environment variables
 load_dotenv()
@@ -21,8 +29,33 @@ logger = logging.getLogger(__name__)
 # Initialize Slack app
 app = App(token=os.environ["SLACK_BOT_TOKEN"])
 
-# Set to track processing PDFs
-processing_pdfs = set()
+# Finished results by PDF content; identical uploads are answered from it or wait for the running job
+result_cache = ResultCache()
+
+# Slack can report one upload twice (file_created and file_shared). (file id, channel) -> None while
+# the upload is being processed, or the time it finished; repeats within the window are ignored.
+recent_uploads = {}
+recent_uploads_lock = threading.Lock()
+DUPLICATE_EVENT_WINDOW = 60  # Seconds
+
+# batch: post everything after run.py finishes; progressive: post each result as soon as its stage completes
+SLACK_DELIVERY_MODE = os.getenv("SLACK_DELIVERY_MODE", "batch").lower()
+
+# Shared pool for concurrent Slack uploads
+upload_executor = ThreadPoolExecutor(max_workers=4)
+
+# Channels whose next upload should be profiled (set with the /profile command)
+profile_requests = set()
+
+# Every upload is processed in its own job directory, so jobs never share intermediate files
+TEMP_DIR = os.path.abspath(os.getenv("TEMP_DIR", "/tmp/slackbot"))
+# Stage checkpoints per PDF content, kept outside the job directories (which are deleted after every
+# upload) so a job that failed part-way resumes when the same paper is uploaded again. Directories not
+# written to for CHECKPOINT_RETENTION_SECONDS are removed at startup and after every job.
+SLACK_CHECKPOINT_DIR = os.path.abspath(os.getenv("SLACK_CHECKPOINT_DIR", "checkpoints"))
+
+# Pre-warmed stage workers (WORKER_POOL_SIZE > 0); None runs each job through a run.py subprocess
+worker_pool = None
 
 # Synchronous function: Download file
 def download_file(url, file_path):
@@ -40,21 +73,22 @@ async def _download_file(url, file_path):
                 logger.error(f"File download failed: {response.status}")
                 return False
 
-# Synchronous function: Run run.py
-def run_script():
+# Synchronous function: Run run.py. Returns (reached the graph stage, every stage succeeded).
+def run_script(env=None):
     logger.info("Starting to run script...")
-    result = asyncio.run(_run_script())
+    result = asyncio.run(_run_script(env))
     logger.info(f"Script run result: {result}")
     return result
 
-async def _run_script():
+async def _run_script(env=None):
     current_dir = os.getcwd()
     logger.info(f"Current working directory: {current_dir}")
     
     process = await asyncio.create_subprocess_exec(
         'python3', 'run.py',
         stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
+        stderr=asyncio.subprocess.PIPE,
+        env=env
     )
     stdout, stderr = await process.communicate()
     
@@ -63,19 +97,267 @@ async def _run_script():
     if stderr:
         logger.error(f'[run.py] stderr:\n{stderr.decode()}')
     
-    if "GraphMaker2_png.py execution successful" in stdout.decode() or "GraphMaker2_png.py execution completed" in stdout.decode():
+    output = stdout.decode()
+    run_success = "GraphMaker2_png.py execution successful" in output or "GraphMaker2_png.py execution completed" in output
+    return run_success, PIPELINE_COMPLETE_MESSAGE in output
+
+# Synchronous function: Run run.py and report each stage as soon as it completes
+def run_script_progressive(on_stage_complete, env=None):
+    logger.info("Starting to run script with progressive delivery...")
+    result = asyncio.run(_run_script_progressive(on_stage_complete, env))
+    logger.info(f"Script run result: {result}")
+    return result
+
+async def _run_script_progressive(on_stage_complete, env=None):
+    # -u keeps run.py's stdout unbuffered so stage messages arrive while it is still running
+    process = await asyncio.create_subprocess_exec(
+        'python3', '-u', 'run.py',
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env=env
+    )
+    loop = asyncio.get_running_loop()
+    graph_done = False
+    complete = False
+    # Completed stages waiting to be posted; a separate task posts them in order, so reading
+    # run.py's output never waits on Slack and a slow upload cannot back up its pipe
+    deliveries = asyncio.Queue()
+
+    async def read_stdout():
+        nonlocal graph_done, complete
+        try:
+            async for raw_line in process.stdout:
+                line = raw_line.decode().rstrip()
+                if not line:
+                    continue
+                logger.info(f'[run.py] {line}')
+                complete = complete or line == PIPELINE_COMPLETE_MESSAGE
+                for script in ('Groq.py', 'ReferenceGenerator.py', 'GraphMaker2_png.py'):
+                    if line.startswith(f"{script} execution successful") or line.startswith(f"{script} execution completed"):
+                        graph_done = graph_done or script == 'GraphMaker2_png.py'
+                        deliveries.put_nowait(script)
+        finally:
+            deliveries.put_nowait(None)
+
+    async def deliver():
+        while True:
+            script = await deliveries.get()
+            if script is None:
+                break
+            await loop.run_in_executor(None, on_stage_complete, script)
+
+    async def read_stderr():
+        stderr = await process.stderr.read()
+        if stderr:
+            logger.error(f'[run.py] stderr:\n{stderr.decode()}')
+
+    await asyncio.gather(read_stdout(), read_stderr(), deliver())
+    await process.wait()
+    return graph_done, complete
+
+# Run a job in-process on the pre-warmed worker pool
+def run_pipeline_pooled(env, on_stage_complete=None):
+    from run import run_pipeline
+
+    complete = False
+
+    def log(message, file=None):
+        nonlocal complete
+        complete = complete or message == PIPELINE_COMPLETE_MESSAGE
+        if file is None:
+            logger.info(f'[run.py] {message}')
+        else:
+            logger.error(f'[run.py] {message}')
+
+    result = run_pipeline(env["JOB_DIR"], env["INPUT_PDF_PATH"], env=env, pool=worker_pool,
+                          on_stage_complete=on_stage_complete, log=log)
+    logger.info(f"Pipeline run result: {result}")
+    return result, complete
+
+# Upload a result file to Slack, optionally into a thread
+def upload_file(channels, path, initial_comment, thread_ts=None):
+    try:
+        with open(path, "rb") as file_content:
+            upload_result = app.client.files_upload_v2(
+                channels=channels,
+                file=file_content,
+                filename=os.path.basename(path),
+                initial_comment=initial_comment,
+                thread_ts=thread_ts
+            )
+        logger.info(f"File upload successful ({path}): {upload_result}")
         return True
-    return False
+    except Exception as e:
+        logger.error(f"File upload failed ({path}): {e}")
+        return False
+
+# Environment for a run.py job; profiled jobs write their reports into the job directory
+def job_environment(job_dir, input_pdf_path, profile):
+    env = dict(os.environ, JOB_DIR=job_dir, INPUT_PDF_PATH=input_pdf_path)
+    if not profile:
+        return env, None
+    profile_dir = os.path.join(job_dir, "profiles")
+    env.update(PROFILE="True", PROFILE_DIR=profile_dir)
+    return env, profile_dir
+
+# Zip a job's profiling reports and upload them to Slack
+def upload_profile_reports(channels, profile_dir, thread_ts=None):
+    if not os.path.isdir(profile_dir):
+        logger.warning(f"No profiling reports found in {profile_dir}")
+        return
+    archive = shutil.make_archive(profile_dir, 'zip', profile_dir)
+    upload_file(channels, archive, "Profiling reports (pstats, collapsed stacks, top allocators) for this job.", thread_ts)
+
+class ProgressiveDelivery:
+    """
+    Posts pipeline results as their stages complete.
+
+    The summary is posted as soon as Groq.py finishes; the citation and the
+    uploads are threaded under it, and uploads run concurrently. Posts are made
+    in stage order on a thread of their own, so the pipeline never waits on Slack.
+    """
+
+    def __init__(self, file_info, channel_id, say, job_dir):
+        self.file_info = file_info
+        self.job_dir = job_dir
+        self.channel_id = channel_id
+        self.say = say
+        self.thread_ts = None
+        self.summary = None
+        self.uploads = []
+        self.posts = ThreadPoolExecutor(max_workers=1)
+
+    def on_stage_complete(self, script):
+        self.posts.submit(self.deliver, script)
+
+    def deliver(self, script):
+        try:
+            if script == 'Groq.py':
+                with open(os.path.join(self.job_dir, 'summary.txt'), mode='r') as f:
+                    self.summary = f.read()
+                response = self.say(channel=self.channel_id, text=self.summary)
+                self.thread_ts = response.get("ts") if response else None
+            elif script == 'ReferenceGenerator.py':
+                with open(os.path.join(self.job_dir, 'citations.txt'), mode='r') as f:
+                    citation = f.read().strip()
+                if citation:
+                    self.say(channel=self.channel_id, text=citation, thread_ts=self.thread_ts)
+                self.uploads.append(upload_executor.submit(
+                    upload_file, self.file_info["channels"], os.path.join(self.job_dir, "output.txt"),
+                    "This is the text file of the processing result.", self.thread_ts))
+            elif script == 'GraphMaker2_png.py':
+                self.uploads.append(upload_executor.submit(
+                    upload_file, self.file_info["channels"], os.path.join(self.job_dir, "knowledge_graph.png"),
+                    "This is the knowledge graph of the processing result.", self.thread_ts))
+        except Exception as e:
+            logger.error(f"Failed to deliver results of {script}: {e}")
+
+    def finish(self):
+        # Wait for the posts, then for the concurrent uploads they started
+        self.posts.shutdown(wait=True)
+        return all(upload.result() for upload in self.uploads)
+
+# Post the results in a job directory: the text in the channel, the files as uploads
+def post_results(file_info, channel_id, say, job_dir):
+    try:
+        with open(os.path.join(job_dir, 'output.txt'), mode='r') as f:
+            output_text = f.read()
+        say(channel=channel_id, text=output_text)
+
+        # Upload output file
+        upload_file(file_info["channels"], os.path.join(job_dir, "output.txt"), "This is the text file of the processing result.")
+
+        # Upload image file
+        upload_file(file_info["channels"], os.path.join(job_dir, "knowledge_graph.png"), "This is the knowledge graph of the processing result.")
+
+        say(channel=channel_id, text="Processing complete!")
+
+    except Exception as e:
+        logger.error(f"Failed to send results: {str(e)}")
+        say(channel=channel_id, text="Processing complete, but an error occurred while sending the results.")
+
+# Re-post a finished result for a paper that was processed before
+def deliver_cached(file_info, channel_id, say, job_dir):
+    file_name = file_info["name"]
+    logger.info(f"Serving {file_name} from cached results")
+    say(channel=channel_id, text=f"File {file_name} has been processed before. Posting the saved results...")
+    if SLACK_DELIVERY_MODE != 'progressive':
+        post_results(file_info, channel_id, say, job_dir)
+        return
+    delivery = ProgressiveDelivery(file_info, channel_id, say, job_dir)
+    for script in ('Groq.py', 'ReferenceGenerator.py', 'GraphMaker2_png.py'):
+        delivery.on_stage_complete(script)
+    if delivery.finish():
+        say(channel=channel_id, text="Processing complete!", thread_ts=delivery.thread_ts)
+    else:
+        say(channel=channel_id, text="Processing complete, but an error occurred while sending the results.", thread_ts=delivery.thread_ts)
+
+# Run the pipeline for a downloaded PDF and post the results.
+# Returns True only if every stage succeeded, i.e. the results are complete and may be cached.
+def run_and_deliver(file_info, channel_id, say, job_dir, job_env):
+    file_name = file_info["name"]
+    say(channel=channel_id, text=f"File {file_name} received. Starting processing...")
+
+    if SLACK_DELIVERY_MODE == 'progressive':
+        delivery = ProgressiveDelivery(file_info, channel_id, say, job_dir)
+        try:
+            if worker_pool:
+                run_success, complete = run_pipeline_pooled(job_env, delivery.on_stage_complete)
+            else:
+                run_success, complete = run_script_progressive(delivery.on_stage_complete, job_env)
+        except Exception as e:
+            logger.error(f"Error running script: {str(e)}")
+            run_success = complete = False
+        uploads_success = delivery.finish()
+        if not run_success:
+            say(channel=channel_id, text="An error occurred during processing. Please check the logs for more information.", thread_ts=delivery.thread_ts)
+        elif not uploads_success:
+            say(channel=channel_id, text="Processing complete, but an error occurred while sending the results.", thread_ts=delivery.thread_ts)
+        else:
+            say(channel=channel_id, text="Processing complete!", thread_ts=delivery.thread_ts)
+        return run_success and complete
+
+    try:
+        run_success, complete = run_pipeline_pooled(job_env) if worker_pool else run_script(job_env)
+        if not run_success:
+            say(channel=channel_id, text="An error occurred during processing. Please check the logs for more information.")
+            return False
+    except Exception as e:
+        logger.error(f"Error running script: {str(e)}")
+        say(channel=channel_id, text=f"An error occurred while running the script: {str(e)}")
+        return False
+
+    post_results(file_info, channel_id, say, job_dir)
+    return complete
+
+# Claim an upload for processing, unless Slack already reported it (or is reporting it) to this channel
+def begin_upload(key):
+    now = time.time()
+    with recent_uploads_lock:
+        for other, finished in list(recent_uploads.items()):
+            if finished is not None and now - finished > DUPLICATE_EVENT_WINDOW:
+                del recent_uploads[other]
+        if key in recent_uploads:
+            return False
+        recent_uploads[key] = None
+        return True
+
+def end_upload(key):
+    with recent_uploads_lock:
+        recent_uploads[key] = time.time()
 
 # Process file
 def process_file(file_info, say):
+    profile_dir = None
+    job_dir = None
+    channel_id = None
+    upload_key = None
     try:
         file_id = file_info["id"]
         file_name = file_info["name"]
         file_url = file_info["url_private_download"]
         
         # Safely get channel_id
-        channel_id = None
         if "channels" in file_info and file_info["channels"]:
             channel_id = file_info["channels"][0]
         elif "ims" in file_info and file_info["ims"]:
@@ -89,79 +371,71 @@ def process_file(file_info, say):
             say(channel=channel_id, text="Please upload a PDF file.")
             return
 
-        if file_name in processing_pdfs:
-            say(channel=channel_id, text=f"File {file_name} is currently being processed. Please wait.")
+        # Coalesce duplicate events for this upload before anything is downloaded or posted
+        if not begin_upload((file_id, channel_id)):
+            logger.info(f"Ignoring duplicate event for {file_name} ({file_id}) in {channel_id}")
             return
+        upload_key = (file_id, channel_id)
 
-        processing_pdfs.add(file_name)
+        job_dir = os.path.join(TEMP_DIR, f"{file_id}_{int(time.time())}")
+        os.makedirs(job_dir, exist_ok=True)
+        input_pdf_path = os.path.join(job_dir, 'input.pdf')
 
-        input_pdf_path = 'input.pdf'
+        profile = channel_id in profile_requests
+        job_env, profile_dir = job_environment(job_dir, input_pdf_path, profile)
+        profile_requests.discard(channel_id)
+
+        # A file seen before (this upload, shared again) is recognised from its Slack metadata, without downloading it again
+        content_hash = result_cache.hash_for(file_info)
+        if content_hash and not profile and result_cache.materialize(content_hash, job_env, job_dir):
+            deliver_cached(file_info, channel_id, say, job_dir)
+            return
 
         download_success = download_file(file_url, input_pdf_path)
         if not download_success:
             say(channel=channel_id, text="File download failed. Please try again.")
-            processing_pdfs.remove(file_name)
             return
+        content_hash = hash_file(input_pdf_path)
+        result_cache.remember(file_info, content_hash)
+        checkpoint_dir = os.path.join(SLACK_CHECKPOINT_DIR, content_hash)
+        job_env["CHECKPOINT_DIR"] = checkpoint_dir
 
-        say(channel=channel_id, text=f"File {file_name} received. Starting processing...")
-
-        try:
-            run_success = run_script()
-            if not run_success:
-                say(channel=channel_id, text="An error occurred during processing. Please check the logs for more information.")
-                processing_pdfs.remove(file_name)
+        # Profiled jobs always run, since the point is to measure the pipeline; run.py also bypasses
+        # the artifact store for them
+        while True:
+            if not profile and result_cache.materialize(content_hash, job_env, job_dir):
+                deliver_cached(file_info, channel_id, say, job_dir)
                 return
-        except Exception as e:
-            logger.error(f"Error running script: {str(e)}")
-            say(channel=channel_id, text=f"An error occurred while running the script: {str(e)}")
-            processing_pdfs.remove(file_name)
-            return
+            leader, running = result_cache.claim(content_hash)
+            if leader:
+                break
+            # Identical content is already being processed: wait for it instead of running it twice
+            say(channel=channel_id, text=f"The same PDF as {file_name} is currently being processed. Its results will be posted here when it finishes.")
+            running.wait()
 
         try:
-            with open('output.txt', mode='r') as f:
-                output_text = f.read()
-            say(channel=channel_id, text=output_text)
-
-            # Upload output file
-            try:
-                with open("output.txt", "rb") as file_content:
-                    upload_result = app.client.files_upload_v2(
-                        channels=file_info["channels"],
-                        file=file_content,
-                        filename="output.txt",
-                        initial_comment="This is the text file of the processing result."
-                    )
-                logger.info(f"Text file upload successful: {upload_result}")
-            except Exception as e:
-                logger.error(f"Text file upload failed: {e}")
-
-            # Upload image file
-            try:
-                with open("knowledge_graph.png", "rb") as file_content:
-                    upload_result = app.client.files_upload_v2(
-                        channels=file_info["channels"],
-                        file=file_content,
-                        filename="knowledge_graph.png",
-                        initial_comment="This is the knowledge graph of the processing result."
-                    )
-                logger.info(f"Image file upload successful: {upload_result}")
-            except Exception as e:
-                logger.error(f"Image file upload failed: {e}")
-
-            say(channel=channel_id, text="Processing complete!")
-
-        except Exception as e:
-            logger.error(f"Failed to send results: {str(e)}")
-            say(channel=channel_id, text="Processing complete, but an error occurred while sending the results.")
-            return
+            # Partial results (no graph, missing citations) are posted but never cached, so a later upload retries
+            if run_and_deliver(file_info, channel_id, say, job_dir, job_env) and is_complete(job_dir):
+                result_cache.put(content_hash, job_env, job_dir)
+                shutil.rmtree(checkpoint_dir, ignore_errors=True)  # Every stage finished; nothing to resume
+            else:
+                logger.info(f"Results for {file_name} are incomplete; not caching them")
+        finally:
+            result_cache.release(content_hash)
+            remove_stale_checkpoints(SLACK_CHECKPOINT_DIR, keep=result_cache.in_flight())
 
     except Exception as e:
         logger.error(f"Error processing file: {str(e)}")
         if channel_id:
             say(channel=channel_id, text=f"An error occurred while processing the file: {str(e)}")
     finally:
-        if 'file_name' in locals():
-            processing_pdfs.remove(file_name)
+        if profile_dir:
+            upload_profile_reports(file_info["channels"], profile_dir)
+        # Results live on in the artifact store; the job's working copies are no longer needed
+        if job_dir:
+            shutil.rmtree(job_dir, ignore_errors=True)
+        if upload_key:
+            end_upload(upload_key)
 
 @app.event("file_created")
 def handle_file_created(body, logger):
@@ -195,6 +469,17 @@ def handle_file_shared(body, logger):
     else:
         logger.warning("Received file_shared event without file_id")
 
+@app.command("/profile")
+def handle_profile_command(ack, command, respond):
+    ack()
+    channel_id = command["channel_id"]
+    if command.get("text", "").strip().lower() == "off":
+        profile_requests.discard(channel_id)
+        respond("Profiling cancelled for the next PDF in this channel.")
+    else:
+        profile_requests.add(channel_id)
+        respond("The next PDF uploaded to this channel will be profiled; the reports will be uploaded when it finishes.")
+
 @app.event("message")
 def handle_message(event, say):
     if "files" not in event:
@@ -208,6 +493,15 @@ def error_handler(error, body, logger):
 
 # Main function
 if __name__ == "__main__":
+    from WorkerPool import WORKER_POOL_SIZE, WorkerPool
+
+    removed = remove_stale_checkpoints(SLACK_CHECKPOINT_DIR)
+    if removed:
+        logger.info(f"Removed {removed} stale checkpoint directories from {SLACK_CHECKPOINT_DIR}")
+    if WORKER_POOL_SIZE > 0:
+        # Fork the worker spawner before the socket-mode threads start; replacement workers come from it
+        worker_pool = WorkerPool(WORKER_POOL_SIZE)
+        logger.info(f"Started {WORKER_POOL_SIZE} pre-warmed pipeline workers")
     handler = SocketModeHandler(app, os.environ["SLACK_APP_TOKEN"])
     handler.start()
 
@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+from contextlib import closing
+
+from ArtifactStore import ArtifactStore
+
+
+def publish(store, tmp_path, key='a' * 64):
+    path = tmp_path / 'summary.txt'
+    path.write_text('summary')
+    store.put(key, 'Groq.py', [str(path)])
+    return key
+
+
+def test_acquire_returns_the_artifact_and_pins_it(tmp_path):
+    with closing(ArtifactStore(str(tmp_path / 'store'))) as store:
+        assert store.acquire('b' * 64) is None
+        key = publish(store, tmp_path)
+        artifact = store.acquire(key)
+        assert artifact['files'] == ['summary.txt']
+        assert store.collect(retention_seconds=-1) == 0
+        store.release(key)
+        assert store.collect(retention_seconds=-1) == 1
+        assert store.acquire(key) is None
+
+
+def test_collect_reclaims_references_of_dead_processes(tmp_path):
+    root = str(tmp_path / 'store')
+    with closing(ArtifactStore(root)) as store:
+        key = publish(store, tmp_path)
+    # A job that acquires the artifact and is gone without releasing it
+    repository = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    subprocess.run([sys.executable, '-c', f"import sys; sys.path.insert(0, {repository!r}); "
+                    f"from ArtifactStore import ArtifactStore; ArtifactStore({root!r}).acquire({key!r})"], check=True)
+    with closing(ArtifactStore(root)) as store:
+        assert store.collect(retention_seconds=-1) == 1
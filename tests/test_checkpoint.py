@@ -0,0 +1,21 @@
+import os
+import time
+
+from Checkpoint import Checkpoint, remove_stale_checkpoints
+
+
+def write_checkpoint(root, name, age):
+    checkpoint = Checkpoint('PDFParser', 'fingerprint', directory=str(root / name))
+    checkpoint.put('html:0', '<p>page</p>')
+    stamp = time.time() - age
+    for path in (checkpoint.path, str(root / name)):
+        os.utime(path, (stamp, stamp))
+
+
+def test_stale_checkpoint_directories_are_removed(tmp_path):
+    write_checkpoint(tmp_path, 'stale', age=3600)
+    write_checkpoint(tmp_path, 'running', age=3600)
+    write_checkpoint(tmp_path, 'recent', age=0)
+    assert remove_stale_checkpoints(str(tmp_path), retention_seconds=60, keep={'running'}) == 1
+    assert sorted(os.listdir(tmp_path)) == ['recent', 'running']
+    assert remove_stale_checkpoints(str(tmp_path / 'missing')) == 0
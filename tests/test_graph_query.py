@@ -0,0 +1,67 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import networkx as nx
+import pytest
+
+from GraphQuery import GraphService, make_handler
+from GraphStore import save_graph
+
+
+def write_graph(directory, labels, name='graph'):
+    G = nx.Graph()
+    for i, label in enumerate(labels):
+        G.add_node(i, label=label, importance=1)
+    for i in range(1, len(labels)):
+        G.add_edge(i - 1, i, label='uses')
+    path = str(directory / f"{name}.kgb")
+    save_graph(G, path)
+    return path
+
+
+@pytest.mark.parametrize('labels', [["AI", "ML"], ["A"], []])
+def test_short_and_empty_labels_load_and_search(tmp_path, labels):
+    service = GraphService([write_graph(tmp_path, labels)], warm=True)
+    index = service.graphs['graph']
+    assert index.search_fuzzy('AI') == index.search_prefix('AI')
+    assert index.search_fuzzy('machine learning') == []
+    if labels:
+        assert index.search_prefix(labels[0])[0]['label'] == labels[0]
+
+
+def test_fuzzy_search_finds_close_labels(tmp_path):
+    service = GraphService([write_graph(tmp_path, ["Transformer", "Attention", "AI"])], warm=True)
+    results = service.graphs['graph'].search_fuzzy('transfomer')
+    assert [node['label'] for node in results] == ["Transformer"]
+
+
+def test_query_without_letters_or_digits_is_rejected(tmp_path):
+    service = GraphService([write_graph(tmp_path, ["Transformer"])])
+    for mode in ('prefix', 'fuzzy'):
+        with pytest.raises(ValueError):
+            service.query('search', {'q': '!!!', 'mode': mode})
+
+
+def test_http_errors_are_answered(tmp_path):
+    path = write_graph(tmp_path, ["Transformer", "Attention"])
+    service = GraphService([str(tmp_path)])
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(service))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with pytest.raises(HTTPError) as error:
+            urlopen(f"{base_url}/search?q=!!!")
+        assert error.value.code == 400
+
+        with open(path, 'wb') as file:
+            file.write(b'corrupt')
+        with pytest.raises(HTTPError) as error:
+            urlopen(Request(f"{base_url}/reload", method='POST'))
+        assert error.value.code == 500
+        assert 'error' in json.load(error.value)
+    finally:
+        server.shutdown()
+        server.server_close()
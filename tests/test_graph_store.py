@@ -0,0 +1,62 @@
+import networkx as nx
+import pytest
+
+from GraphStore import load_graph, read_header, save_graph
+
+
+def round_trip(tmp_path, G, mmap=True):
+    path = str(tmp_path / 'graph.kgb')
+    save_graph(G, path, metadata={'paper': 'test'})
+    return load_graph(path, mmap=mmap), path
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+@pytest.mark.parametrize('directed', [False, True])
+def test_graph_round_trips_with_labels_and_attributes(tmp_path, mmap, directed):
+    G = nx.DiGraph() if directed else nx.Graph()
+    G.add_node('llm', label='Large Language Models (LLMs)', importance=5)
+    G.add_node('rlhf', label='Réglage par renforcement 强化学习', importance=2.5)
+    G.add_node('empty', label='', importance=None)
+    G.add_edge('rlhf', 'llm', label='aligns')
+    G.add_edge('llm', 'empty', label='')
+
+    graph, path = round_trip(tmp_path, G, mmap)
+    header, _ = read_header(path)
+    assert header['metadata'] == {'paper': 'test'}
+    assert (graph.number_of_nodes, graph.number_of_edges) == (3, 2)
+    assert graph.node_labels() == ['Large Language Models (LLMs)', 'Réglage par renforcement 强化学习', '']
+    assert sorted(graph.edges()) == sorted(G.edges(data='label'))
+
+    restored = graph.to_networkx()
+    assert restored.is_directed() == directed
+    assert restored.nodes['llm'] == {'label': 'Large Language Models (LLMs)', 'importance': 5}
+    assert isinstance(restored.nodes['llm']['importance'], int)
+    assert restored.nodes['rlhf']['importance'] == 2.5
+    assert restored.nodes['empty']['importance'] == 0
+    assert set(restored.edges(data='label')) == set(G.edges(data='label'))
+
+
+@pytest.mark.parametrize('ids, restored', [
+    ([1, 2, 3], [1, 2, 3]),
+    (['a', 'b'], ['a', 'b']),
+    ([True, False], ['True', 'False']),
+    ([1, 'b'], ['1', 'b']),
+    ([1.5, 2], ['1.5', '2']),
+])
+def test_node_id_types(tmp_path, ids, restored):
+    G = nx.Graph()
+    for node in ids:
+        G.add_node(node, label=f"label {node}", importance=1)
+    G.add_edge(ids[0], ids[1], label='related')
+
+    graph, _ = round_trip(tmp_path, G)
+    assert list(graph.to_networkx().nodes) == restored
+    assert list(graph.edges()) == [(restored[0], restored[1], 'related')]
+
+
+def test_ids_stored_alike_are_rejected(tmp_path):
+    G = nx.Graph()
+    G.add_node(1, label='one')
+    G.add_node('1', label='also one')
+    with pytest.raises(ValueError):
+        round_trip(tmp_path, G)
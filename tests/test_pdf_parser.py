@@ -0,0 +1,80 @@
+import fitz
+
+from PDFParser import html2txt, is_stop_heading, pdf2html_lazy, pdf2sections
+
+BODY_LINE = "Body text of the paper, wrapped across several lines of a column"
+
+
+def write_paper(path, appendix_heading=True):
+    doc = fitz.open()
+    page = doc.new_page()
+    y = 72
+    page.insert_text((72, y), "1 Introduction", fontname="hebo", fontsize=12)
+    y += 20
+    for i in range(5):
+        page.insert_text((72, y), f"{BODY_LINE} {i}", fontname="helv", fontsize=10)
+        y += 14
+    # A wrapped body line that happens to start with "Appendix"
+    page.insert_text((72, y), "Appendix B for the full proof", fontname="helv", fontsize=10)
+    y += 14
+    page.insert_text((72, y), "Supplementary Material, see", fontname="helv", fontsize=10)
+    y += 14
+    page.insert_text((72, y), "Body text after the wrapped lines", fontname="helv", fontsize=10)
+    page = doc.new_page()
+    page.insert_text((72, 72), "2 Method", fontname="hebo", fontsize=12)
+    page.insert_text((72, 92), "Method body text", fontname="helv", fontsize=10)
+    if appendix_heading:
+        page = doc.new_page()
+        page.insert_text((72, 72), "Appendix A Proofs", fontname="hebo", fontsize=12)
+        page.insert_text((72, 92), "Proof body text", fontname="helv", fontsize=10)
+    doc.save(path)
+
+
+def extract(tmp_path, **kwargs):
+    pdf_path, html_path, text_path = (str(tmp_path / name) for name in ('paper.pdf', 'paper.html', 'paper.txt'))
+    write_paper(pdf_path, **kwargs)
+    report = pdf2html_lazy(pdf_path, html_path, token_budget=0)
+    html2txt(html_path, text_path, stop_at_appendix=True)
+    with open(text_path, encoding='utf-8') as file:
+        return report, file.read()
+
+
+def test_wrapped_body_line_does_not_stop_extraction(tmp_path):
+    report, text = extract(tmp_path, appendix_heading=False)
+    assert report['touched'] == 2
+    assert report['stopped_at'] == 'end of document'
+    assert "Appendix B for the full proof" in text
+    assert "Method body text" in text
+
+
+def test_appendix_heading_stops_extraction(tmp_path):
+    report, text = extract(tmp_path)
+    assert report['touched'] == 3
+    assert report['stopped_at'] == 'bibliography or appendix'
+    assert "Body text after the wrapped lines" in text
+    assert "Appendix A Proofs" not in text
+    assert "Proof body text" not in text
+
+
+def test_stop_heading_needs_heading_style():
+    assert is_stop_heading("References")
+    assert is_stop_heading("Appendix A Proofs", bold=True)
+    assert is_stop_heading("Appendix A Proofs", size=12, body_size=10)
+    assert not is_stop_heading("Appendix B for the full proof", size=10, body_size=10)
+    assert not is_stop_heading("Appendix A shows that the bound holds for all inputs", bold=True)
+
+
+def test_words_starting_with_abstract_are_not_the_abstract(tmp_path):
+    path = str(tmp_path / 'paper.pdf')
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "A Paper Title", fontname="hebo", fontsize=18)
+    page.insert_text((72, 110), "Abstractive summarisation of long documents", fontname="helv", fontsize=10)
+    page.insert_text((72, 140), "Abstract: We propose a method.", fontname="helv", fontsize=10)
+    page.insert_text((72, 170), "1 Introduction", fontname="hebo", fontsize=12)
+    page.insert_text((72, 190), "Introduction body text", fontname="helv", fontsize=10)
+    doc.save(path)
+
+    document = pdf2sections(path)
+    assert document['abstract'] == "We propose a method."
+    assert "Abstractive summarisation" in document['front_matter']
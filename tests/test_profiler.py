@@ -0,0 +1,52 @@
+import os
+import pstats
+from concurrent.futures import ThreadPoolExecutor
+
+from Profiler import profile_stage, profiled_worker
+
+
+def after_inner_stage():
+    return sum(range(1000))
+
+
+def test_nested_stage_keeps_outer_profile(tmp_path):
+    directory = str(tmp_path)
+    with profile_stage('outer', enabled=True, directory=directory):
+        with profile_stage('inner', enabled=True, directory=directory):
+            sum(range(1000))
+        after_inner_stage()
+
+    stats = pstats.Stats(os.path.join(directory, 'outer.pstats'))
+    assert any(name == 'after_inner_stage' for _, _, name in stats.stats)
+    assert not os.path.exists(os.path.join(directory, 'inner.pstats'))
+    with open(os.path.join(directory, 'inner.txt'), encoding='utf-8') as file:
+        assert 'Wall time' in file.read()
+
+
+def test_stage_after_nested_stage_is_profiled_again(tmp_path):
+    directory = str(tmp_path)
+    with profile_stage('outer', enabled=True, directory=directory):
+        with profile_stage('inner', enabled=True, directory=directory):
+            pass
+    with profile_stage('next', enabled=True, directory=directory):
+        after_inner_stage()
+    assert os.path.exists(os.path.join(directory, 'next.pstats'))
+
+
+def on_worker_thread():
+    return sum(range(1000))
+
+
+def test_work_on_worker_threads_is_in_the_stage_report(tmp_path):
+    directory = str(tmp_path)
+    with profile_stage('stage', enabled=True, directory=directory):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(profiled_worker(lambda _: on_worker_thread()), range(4)))
+
+    stats = pstats.Stats(os.path.join(directory, 'stage.pstats'))
+    calls = [stat[1] for (_, _, name), stat in stats.stats.items() if name == 'on_worker_thread']
+    assert calls == [4]
+
+
+def test_profiled_worker_is_transparent_without_profiling():
+    assert profiled_worker(on_worker_thread)() == on_worker_thread()
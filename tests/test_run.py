@@ -0,0 +1,91 @@
+import functools
+import json
+import os
+
+import run
+from ArtifactStore import ArtifactStore
+from run import job_names, run_script, stage_environment
+
+
+def quiet(message, file=None):
+    pass
+
+
+def run_stages(tmp_path, monkeypatch, **env):
+    """Run the pipeline with stand-in stages that write their outputs; returns the stages that ran."""
+    ran = []
+
+    def fake_run_script(script, job_dir, env, pool, log, timeout):
+        ran.append(script)
+        for name in run.STAGES[script]['outputs']:
+            with open(os.path.join(job_dir, name), 'w', encoding='utf-8') as file:
+                file.write(script)
+        return True
+
+    monkeypatch.setattr(run, 'run_script', fake_run_script)
+    monkeypatch.setattr(run, 'ArtifactStore', functools.partial(ArtifactStore, str(tmp_path / 'store')))
+    assert run.run_pipeline(str(tmp_path / 'job'), str(tmp_path / 'input.pdf'), env=dict(os.environ, **env), log=quiet)
+    return ran
+
+
+def test_profiled_job_bypasses_the_artifact_store(tmp_path, monkeypatch):
+    (tmp_path / 'input.pdf').write_bytes(b'%PDF')
+    assert run_stages(tmp_path, monkeypatch, ARTIFACT_CACHE='True') == list(run.STAGES)
+    assert run_stages(tmp_path, monkeypatch, ARTIFACT_CACHE='True') == []
+    assert run_stages(tmp_path, monkeypatch, ARTIFACT_CACHE='True', PROFILE='True') == list(run.STAGES)
+
+
+def test_reference_stage_finds_the_shared_index_from_its_job_directory(tmp_path, monkeypatch):
+    shared, job = tmp_path / 'shared', tmp_path / 'job'
+    shared.mkdir()
+    job.mkdir()
+    record = {'id': '2401.00001', 'title': 'Indexed Paper', 'authors_parsed': [['Doe', 'Jane', '']],
+              'versions': [{'created': 'Mon, 1 Jan 2024 00:00:00 GMT'}], 'update_date': '2024-01-01'}
+    (shared / 'snapshot.json').write_text(json.dumps(record) + '\n')
+    from ArxivIndex import ArxivIndex
+    with ArxivIndex(str(shared / 'arxiv_index.sqlite')) as index:
+        index.refresh(str(shared / 'snapshot.json'))
+    (job / 'pdf_to_text_temp.txt').write_text('As shown in arXiv:2401.00001, ...')
+    (job / 'summary.txt').write_text('Summary')
+
+    monkeypatch.chdir(shared)
+    monkeypatch.setenv('ARXIV_INDEX_PATH', 'arxiv_index.sqlite')
+    monkeypatch.setenv('ARXIV_CACHE_PATH', 'arxiv_cache.json')
+    monkeypatch.setenv('ARXIV_OFFLINE', 'True')
+    env = stage_environment(str(job), str(job / 'input.pdf'))
+    assert env['ARXIV_INDEX_PATH'] == str(shared / 'arxiv_index.sqlite')
+    assert env['ARXIV_CACHE_PATH'] == str(shared / 'arxiv_cache.json')
+
+    assert run_script('ReferenceGenerator.py', str(job), env, log=quiet)
+    assert 'Jane Doe. (2024). Indexed Paper.' in (job / 'citations.txt').read_text()
+    assert not (job / 'arxiv_index.sqlite').exists()
+
+
+def test_stage_key_follows_imported_modules_and_the_arxiv_index(tmp_path, monkeypatch):
+    for name in ['Groq.py', 'ReferenceGenerator.py'] + run.STAGES['Groq.py']['modules'] + run.STAGES['ReferenceGenerator.py']['modules']:
+        with open(os.path.join(run.SCRIPT_DIR, name), encoding='utf-8') as file:
+            (tmp_path / name).write_text(file.read())
+    monkeypatch.setattr(run, 'SCRIPT_DIR', str(tmp_path))
+    env = {'ARXIV_INDEX_PATH': str(tmp_path / 'arxiv_index.sqlite')}
+
+    def key(script):
+        return run.stage_key(script, str(tmp_path), str(tmp_path / 'input.pdf'), env)
+
+    groq_key, reference_key = key('Groq.py'), key('ReferenceGenerator.py')
+    with open(tmp_path / 'Compressor.py', 'a', encoding='utf-8') as file:
+        file.write('\n# Changed ranking\n')
+    assert key('Groq.py') != groq_key
+
+    (tmp_path / 'snapshot.json').write_text(json.dumps({'id': '2401.00001', 'title': 'Indexed Paper'}) + '\n')
+    from ArxivIndex import ArxivIndex
+    with ArxivIndex(env['ARXIV_INDEX_PATH']) as index:
+        index.refresh(str(tmp_path / 'snapshot.json'))
+    assert key('ReferenceGenerator.py') != reference_key
+
+
+def test_batch_jobs_with_the_same_file_name_get_their_own_directories():
+    names = job_names(['a/paper.pdf', 'b/paper.pdf', 'c/other.pdf'])
+    assert names[2] == 'other'
+    assert names[0].startswith('paper-') and names[1].startswith('paper-')
+    assert names[0] != names[1]
+    assert job_names(['a/paper.pdf', 'b/paper.pdf']) == names[:2]